@@ -4,90 +4,130 @@ by comparing a 7-session total against a baseline week.
 import os
 import numpy as np
 import pandas as pd
-import pingouin as pg
 
-from scipy.stats import sem
+from scipy.stats import sem, rankdata, wilcoxon
 
 import utils
 
 
+def wilcoxon_stats(x, y, alternative="two-sided"):
+    """Run a paired Wilcoxon signed-rank test and get the same
+    table pingouin.wilcoxon gives, with the matched-pairs rank-biserial
+    correlation (RBC) and common language effect size (CLES).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    notna = ~np.isnan(x) & ~np.isnan(y)
+    x, y = x[notna], y[notna]
+    d = x - y
+    d = d[d != 0]
+    if d.size:
+        wval, pval = wilcoxon(x, y, alternative=alternative, correction=True)
+        # Vargha and Delaney's CLES, with ties counting half.
+        diff = x[:, None] - y
+        cles = np.where(diff == 0, .5, diff > 0).mean()
+        cles = 1 - cles if alternative == "less" else cles
+        # Kerby's simple difference formula for the RBC.
+        ranks = rankdata(np.abs(d))
+        rbc = (ranks[d > 0].sum() - ranks[d < 0].sum()) / ranks.sum()
+        rbc = -rbc if alternative == "less" else rbc
+    else: # nothing to test without any pairs that differ
+        wval = pval = cles = rbc = np.nan
+    return pd.DataFrame({"W-val": wval, "alternative": alternative, "p-val": pval,
+        "RBC": rbc, "CLES": cles}, index=["Wilcoxon"])
 
-#### Choose export paths.
 
-basename = "app_effect"
-export_dir = os.path.join(utils.Config.data_directory, "results")
+def app_effect(df):
+    """Run the whole analysis on the merged trials and participants data.
+    Returns the participant-level data, the stats, and a description
+    of the time between sessions 1 and 7.
+    """
+    ################################# Wrangle data.
 
-export_fname_data = os.path.join(export_dir, f"{basename}-data.csv")
-# export_fname_descr = os.path.join(export_dir, f"{basename}-descriptives.csv")
-export_fname_stats = os.path.join(export_dir, f"{basename}-stats.csv")
-# export_fname_plot = os.path.join(export_dir, f"{basename}-plot.csv")
-export_fname_timedesc = os.path.join(export_dir, f"{basename}-timedesc.csv")
+    # There might be a few dreams without a lucidity rating.
+    df = df.dropna(subset=["lucidSelfRating"])
 
+    # Convert boolean lucid success column to integer (1s/0s) for later math.
+    df["lucidSelfRating"] = df["lucidSelfRating"].astype(int)
 
+    # Shouldn't be more than 7 sessions but just to be sure.
+    df = df[df["sessionID"].isin([1,2,3,4,5,6,7])]
 
-################################# Load and wrangle data.
+    # Most sessions have just one trial, but some need to be aggregated into a single score.
+    # Sum the number of LDs for each session.
+    session_df = df.groupby(["subjectID", "sessionID"], as_index=False
+        )["lucidSelfRating"].agg("sum")
 
-df = utils.load_data("merged")
+    # Reduce number of LDs to simple yes/no (1/0) lucidity. (doesn't change much, only a few have >1)
+    session_df["lucidSelfRating"] = session_df["lucidSelfRating"].ge(1).astype(int)
 
-# There might be a few dreams without a lucidity rating.
-df = df.dropna(subset=["lucidSelfRating"])
+    # Pivot out to a table that has sessions as columns
+    # (with a column for every session, even if nobody has one, see analyze-sensitivity.py)
+    table = session_df.pivot(columns="sessionID", values="lucidSelfRating", index="subjectID"
+        ).reindex(columns=[1,2,3,4,5,6,7])
 
-# Convert boolean lucid success column to integer (1s/0s) for later math.
-df["lucidSelfRating"] = df["lucidSelfRating"].astype(int)
+    # Reduce to subjects with all 7 sessions
+    table = table[table.notna().all(axis=1)]
 
-# Shouldn't be more than 7 sessions but just to be sure.
-df = df[df["sessionID"].isin([1,2,3,4,5,6,7])]
+    # Sum across all sessions to get cumulative total amount of LDs per participant per day.
+    cumtable = table.cumsum(axis=1)
 
-# Most sessions have just one trial, but some need to be aggregated into a single score.
-# Sum the number of LDs for each session.
-session_df = df.groupby(["subjectID", "sessionID"], as_index=False
-    )["lucidSelfRating"].agg("sum")
+    # Get the baseline scores for each participant and merge with session data.
+    baseline = df[["subjectID","LDF"]].drop_duplicates("subjectID")
+    data = cumtable.merge(baseline, on="subjectID")
 
-# Reduce number of LDs to simple yes/no (1/0) lucidity. (doesn't change much, only a few have >1)
-session_df["lucidSelfRating"] = session_df["lucidSelfRating"].ge(1).astype(int)
+    data = data.rename(columns={7: "app", "LDF": "baseline"})
 
-# Pivot out to a table that has sessions as columns
-table = session_df.pivot(columns="sessionID", values="lucidSelfRating", index="subjectID")
+    # # Get descriptives summary for the cumulative version.
+    # cumtable_descr = totals[["all_sessions", "baseline"]
+    #     ].agg(["count", "mean"]).round(3).T.unstack(level=1)
 
-# Reduce to subjects with all 7 sessions
-table = table[table.notna().all(axis=1)]
 
-# Sum across all sessions to get cumulative total amount of LDs per participant per day.
-cumtable = table.cumsum(axis=1)
+    ####### Get number of days between first and 7th app use, for final sample.
+    final_subs = data["subjectID"].unique()
+    subset = df[df["subjectID"].isin(final_subs)]
+    subset = subset[subset["sessionID"].isin([1,7])]
+    subset = subset[~subset.duplicated(subset=["subjectID", "sessionID"], keep="first")]
+    subset = subset[["subjectID", "sessionID", "timeStart"]].reset_index(drop=True)
+    subset = subset.pivot(index="subjectID", columns="sessionID", values="timeStart"
+        ).reindex(columns=[1,7]) # same as above
+    timediff = pd.to_datetime(subset[7]) - pd.to_datetime(subset[1])
+    timediff_desc = timediff.describe()
 
-# Get the baseline scores for each participant and merge with session data.
-baseline = df[["subjectID","LDF"]].drop_duplicates("subjectID")
-data = cumtable.merge(baseline, on="subjectID")
+    ####### Run statistics
+    a = data["baseline"].values
+    b = data["app"].values
+    stats = wilcoxon_stats(a, b).rename_axis("test")
 
-data = data.rename(columns={7: "app", "LDF": "baseline"})
+    stats.loc["Wilcoxon", "mean-n"] = len(a) # same as b
+    stats.loc["Wilcoxon", "mean-app"] = data["app"].mean() # NaN, not a warning, if empty
 
-# # Get descriptives summary for the cumulative version.
-# cumtable_descr = totals[["all_sessions", "baseline"]
-#     ].agg(["count", "mean"]).round(3).T.unstack(level=1)
+    return data, stats, timediff_desc
 
 
-####### Get number of days between first and 7th app use, for final sample.
-final_subs = data["subjectID"].unique()
-subset = df[df["subjectID"].isin(final_subs)]
-subset = subset[subset["sessionID"].isin([1,7])]
-subset = subset[~subset.duplicated(subset=["subjectID", "sessionID"], keep="first")]
-subset = subset[["subjectID", "sessionID", "timeStart"]].reset_index(drop=True)
-subset["timeStart"] = pd.to_datetime(subset["timeStart"])
-subset = subset.pivot(index="subjectID", columns="sessionID", values="timeStart")
-timediff = subset[7] - subset[1]
-timediff_desc = timediff.describe()
-timediff_desc.to_csv(export_fname_timedesc, index=True, header=False)
+def run(cache):
+    #### Choose export paths.
 
-####### Run statistics
-a = data["baseline"].values
-b = data["app"].values
-stats = pg.wilcoxon(a, b).rename_axis("test")
+    basename = "app_effect"
+    export_dir = os.path.join(utils.Config.data_directory, "results")
+
+    export_fname_data = os.path.join(export_dir, f"{basename}-data.csv")
+    # export_fname_descr = os.path.join(export_dir, f"{basename}-descriptives.csv")
+    export_fname_stats = os.path.join(export_dir, f"{basename}-stats.csv")
+    # export_fname_plot = os.path.join(export_dir, f"{basename}-plot.csv")
+    export_fname_timedesc = os.path.join(export_dir, f"{basename}-timedesc.csv")
 
-stats.loc["Wilcoxon", "mean-n"] = len(a) # same as b
-stats.loc["Wilcoxon", "mean-app"] = np.mean(b)
-stats.loc["Wilcoxon", "mean-app"] = np.mean(b)
 
+    ################################# Load data and analyze.
+    df = utils.load_data("merged", cache)
+    data, stats, timediff_desc = app_effect(df)
 
-################## Export session-level data, descriptives, and stats.
-data.to_csv(export_fname_data, index=False, na_rep="NA")
-stats.to_csv(export_fname_stats, index=True, float_format="%.4f")
+
+    ################## Export session-level data, descriptives, and stats.
+    data.to_csv(export_fname_data, index=False, na_rep="NA")
+    stats.to_csv(export_fname_stats, index=True, float_format="%.4f")
+    timediff_desc.to_csv(export_fname_timedesc, index=True, header=False)
+
+
+if __name__ == "__main__":
+    run({})
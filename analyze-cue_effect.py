@@ -6,86 +6,18 @@ import itertools
 import json
 import numpy as np
 import pandas as pd
-import pingouin as pg
 
 import utils
 
 
+# Number of bootstrap resamples (the same resamples are used for
+# within-condition CIs and between-condition differences).
+N_BOOT = 100_000
+SEED = 0
 
-#### Choose export paths.
+# Conditions in the order they get compared to each other.
+CONDITIONS = ["active", "sham", "control"]
 
-basename = "cue_effect"
-export_dir = os.path.join(utils.Config.data_directory, "results")
-
-export_fname_data = os.path.join(export_dir, f"{basename}-data.csv")
-export_fname_descr = os.path.join(export_dir, f"{basename}-descriptives.csv")
-export_fname_stats_within = os.path.join(export_dir, f"{basename}-stats_within.csv")
-export_fname_stats_between = os.path.join(export_dir, f"{basename}-stats_between.csv")
-export_fname_potentialn = os.path.join(export_dir, f"{basename}-potentialn.txt")
-export_fname_potentialn_increasing = os.path.join(export_dir, f"{basename}-potentialn_increasing.json")
-
-
-
-################################# Load and wrangle data.
-
-df = utils.load_data("merged")
-
-# Preliminary q: how many participants used app for 2 nights (1 and 2)?
-subset = df[df["sessionID"].isin([1,2])]
-subset = subset[~subset.duplicated(subset=["subjectID", "sessionID"], keep="first")]
-potential_n = subset["subjectID"].value_counts().loc[lambda x: x==2].index.size
-potential_n = f"{potential_n} participants completed both sessions 1 and 2."
-with open(export_fname_potentialn, "w", encoding="utf-8") as f:
-    f.write(potential_n)
-
-# Remove dream reports that are "junk".
-df = df[df["experimenterRating"].isin(["white", "non-lucid", "semi-lucid", "lucid"])]
-
-# There might be a few dreams without a lucidity rating.
-df = df.dropna(subset=["lucidSelfRating"])
-
-# Convert boolean lucid success column to integer (1s/0s) for later math.
-df["lucidSelfRating"] = df["lucidSelfRating"].astype(int)
-
-# Most sessions have one trial, but some need to be aggregated into a single score.
-# Sum the number of LDs for each session.
-data = df.groupby(["subjectCondition", "subjectID", "sessionID"], as_index=False
-    )["lucidSelfRating"].agg("sum")
-
-# Reduce number of LDs to simple yes/no (1/0) lucidity. (doesn't change much, only a few have >1)
-data["lucidSelfRating"] = data["lucidSelfRating"].ge(1).astype(int)
-
-# Side quest, get number of participants who had some form of dream recall at increasing n_nights.
-ns = {}
-for i in range(1, 8):
-    d = data[data["sessionID"].isin(range(1, i+1))]
-    d = d[d["subjectID"].isin((d["subjectID"].value_counts()==i).loc[lambda x: x].index.tolist())]
-    n = d["subjectID"].nunique()
-    ns[i] = n
-with open(export_fname_potentialn_increasing, "w", encoding="utf-8") as f:
-    json.dump(ns, f, indent=4)
-
-# Reduce to first 2 sessions (dropping anyone without both).
-data = data[data["sessionID"].isin([1,2])]
-data = data[data["subjectID"].duplicated(keep=False)]
-
-# Flip out to a table with the 2 sessions as columns
-data = data.pivot(columns="sessionID", values="lucidSelfRating",
-        index=["subjectCondition", "subjectID"]
-    ).rename(columns={1: "session1", 2: "session2"})
-
-# Get a single difference score for each participant
-# that represents their change from session 1 -> session 2.
-data["sessionChange"] = data["session2"] - data["session1"]
-
-descriptives = data.groupby("subjectCondition",
-    )[["session1", "session2", "sessionChange"]
-    ].agg(["count", "mean", "std", "sem"]
-    ).T.reset_index().rename(columns={"level_1": "stat"})
-
-
-
-################# Run statistics.
 
 def pval_from_distribution(dist):
     pct_below = np.mean(dist < 0)
@@ -94,45 +26,154 @@ def pval_from_distribution(dist):
     pval = 2 * min_pct
     return pval
 
-### Within-condition effects
-### (Do LD rates change from 1->2 within each condition?)
-
-stats_list = []
-distributions = {} # for later between stats
-for c, ser in data.groupby("subjectCondition")["sessionChange"]:
-    ci, distr = pg.compute_bootci(ser.values,
-        seed=0,
-        func="mean", n_boot=2000, decimals=2, return_dist=True)
-    stats_list.append({
-        "subjectCondition": c,
-        "n": ser.size,
-        "mean": np.mean(distr),
-        "ci_lo": ci[0],
-        "ci_hi": ci[1],
-        "pval": pval_from_distribution(distr),
-    })
-    distributions[c] = distr
-stats_within = pd.DataFrame(stats_list)
-
-### Between-condition effects
-### (Do LD rates change from 1->2 more or less across conditions?)
-
-stats_list = []
-for c1, c2 in itertools.combinations(["active", "sham", "control"], 2):
-    differences = distributions[c1] - distributions[c2]
-    pval = pval_from_distribution(differences)
-    stats_list.append({
-        "conditionA": c1,
-        "conditionB": c2,
-        "pval": pval,
-    })
-
-stats_between = pd.DataFrame(stats_list)
-
-
-
-########## Export everything.
-data.to_csv(export_fname_data, index=False, na_rep="NA")
-descriptives.to_csv(export_fname_descr, index=False, na_rep="NA", float_format="%.3f")
-stats_within.to_csv(export_fname_stats_within, index=False, float_format="%.5f")
-stats_between.to_csv(export_fname_stats_between, index=False, float_format="%.5f")
+
+def cue_effect(df, n_boot=N_BOOT, seed=SEED, n_jobs=1):
+    """Run the whole analysis on the merged trials and participants data.
+    Returns a dictionary of all the results, keyed on the end
+    of their export filenames (bootstrap settings are passed
+    on to utils.bootstrap_means).
+    """
+    ################################# Wrangle data.
+
+    # Preliminary q: how many participants used app for 2 nights (1 and 2)?
+    subset = df[df["sessionID"].isin([1,2])]
+    subset = subset[~subset.duplicated(subset=["subjectID", "sessionID"], keep="first")]
+    potential_n = subset["subjectID"].value_counts().loc[lambda x: x==2].index.size
+    potential_n = f"{potential_n} participants completed both sessions 1 and 2."
+
+    # Remove dream reports that are "junk".
+    df = df[df["experimenterRating"].isin(["white", "non-lucid", "semi-lucid", "lucid"])]
+
+    # There might be a few dreams without a lucidity rating.
+    df = df.dropna(subset=["lucidSelfRating"])
+
+    # Convert boolean lucid success column to integer (1s/0s) for later math.
+    df["lucidSelfRating"] = df["lucidSelfRating"].astype(int)
+
+    # Most sessions have one trial, but some need to be aggregated into a single score.
+    # Sum the number of LDs for each session.
+    data = df.groupby(["subjectCondition", "subjectID", "sessionID"], as_index=False, observed=True
+        )["lucidSelfRating"].agg("sum")
+
+    # Reduce number of LDs to simple yes/no (1/0) lucidity. (doesn't change much, only a few have >1)
+    data["lucidSelfRating"] = data["lucidSelfRating"].ge(1).astype(int)
+
+    # Side quest, get number of participants who had some form of dream recall at increasing n_nights.
+    ns = {}
+    for i in range(1, 8):
+        d = data[data["sessionID"].isin(range(1, i+1))]
+        d = d[d["subjectID"].isin((d["subjectID"].value_counts()==i).loc[lambda x: x].index.tolist())]
+        n = d["subjectID"].nunique()
+        ns[i] = n
+
+    # Reduce to first 2 sessions (dropping anyone without both).
+    data = data[data["sessionID"].isin([1,2])]
+    data = data[data["subjectID"].duplicated(keep=False)]
+
+    # Flip out to a table with the 2 sessions as columns
+    # (even if nobody has both, see analyze-sensitivity.py)
+    data = data.pivot(columns="sessionID", values="lucidSelfRating",
+            index=["subjectCondition", "subjectID"]
+        ).reindex(columns=[1,2]).rename(columns={1: "session1", 2: "session2"})
+
+    # Get a single difference score for each participant
+    # that represents their change from session 1 -> session 2.
+    data["sessionChange"] = data["session2"] - data["session1"]
+
+    descriptives = data.groupby("subjectCondition", observed=True,
+        )[["session1", "session2", "sessionChange"]
+        ].agg(["count", "mean", "std", "sem"]
+        ).T.reset_index().rename(columns={"level_1": "stat"})
+
+
+
+    ################# Run statistics.
+
+    ### Within-condition effects
+    ### (Do LD rates change from 1->2 within each condition?)
+
+    # Bootstrap the mean change of all conditions at once.
+    # Conditions nobody is left in (see analyze-sensitivity.py) get skipped.
+    grouped = data.groupby("subjectCondition", observed=True)["sessionChange"]
+    conditions = [ c for c, _ in grouped ]
+    groups = [ ser.to_numpy(dtype=float) for _, ser in grouped ]
+    if groups:
+        boot_means = utils.bootstrap_means(groups, n_boot=n_boot, seed=seed, n_jobs=n_jobs)
+    else:
+        boot_means = np.empty((n_boot, 0))
+
+    stats_list = []
+    distributions = {} # for later between stats
+    for c, values, distr in zip(conditions, groups, boot_means.T):
+        ci = np.round(utils.bootstrap_ci(values, distr), 2)
+        stats_list.append({
+            "subjectCondition": c,
+            "n": values.size,
+            "mean": np.mean(distr),
+            "ci_lo": ci[0],
+            "ci_hi": ci[1],
+            "pval": pval_from_distribution(distr),
+        })
+        distributions[c] = distr
+    stats_within = pd.DataFrame(stats_list,
+        columns=["subjectCondition", "n", "mean", "ci_lo", "ci_hi", "pval"])
+
+    ### Between-condition effects
+    ### (Do LD rates change from 1->2 more or less across conditions?)
+
+    stats_list = []
+    for c1, c2 in itertools.combinations(CONDITIONS, 2):
+        if c1 in distributions and c2 in distributions:
+            differences = distributions[c1] - distributions[c2]
+            pval = pval_from_distribution(differences)
+        else:
+            pval = np.nan
+        stats_list.append({
+            "conditionA": c1,
+            "conditionB": c2,
+            "pval": pval,
+        })
+
+    stats_between = pd.DataFrame(stats_list)
+
+    return dict(potentialn=potential_n, potentialn_increasing=ns, data=data,
+        descriptives=descriptives, stats_within=stats_within, stats_between=stats_between)
+
+
+def run(cache):
+    #### Choose export paths.
+
+    basename = "cue_effect"
+    export_dir = os.path.join(utils.Config.data_directory, "results")
+
+    export_fname_data = os.path.join(export_dir, f"{basename}-data.csv")
+    export_fname_descr = os.path.join(export_dir, f"{basename}-descriptives.csv")
+    export_fname_stats_within = os.path.join(export_dir, f"{basename}-stats_within.csv")
+    export_fname_stats_between = os.path.join(export_dir, f"{basename}-stats_between.csv")
+    export_fname_potentialn = os.path.join(export_dir, f"{basename}-potentialn.txt")
+    export_fname_potentialn_increasing = os.path.join(export_dir, f"{basename}-potentialn_increasing.json")
+
+
+
+    ################################# Load data and analyze.
+    df = utils.load_data("merged", cache)
+    results = cue_effect(df, n_jobs=utils.get_n_jobs())
+    data = results["data"]
+    descriptives = results["descriptives"]
+    stats_within = results["stats_within"]
+    stats_between = results["stats_between"]
+
+
+    ########## Export everything.
+    data.to_csv(export_fname_data, index=False, na_rep="NA")
+    descriptives.to_csv(export_fname_descr, index=False, na_rep="NA", float_format="%.3f")
+    stats_within.to_csv(export_fname_stats_within, index=False, float_format="%.5f")
+    stats_between.to_csv(export_fname_stats_between, index=False, float_format="%.5f")
+    with open(export_fname_potentialn, "w", encoding="utf-8") as f:
+        f.write(results["potentialn"])
+    with open(export_fname_potentialn_increasing, "w", encoding="utf-8") as f:
+        json.dump(results["potentialn_increasing"], f, indent=4)
+
+
+if __name__ == "__main__":
+    run({})
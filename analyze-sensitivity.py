@@ -0,0 +1,127 @@
+"""Rerun the app and cue effect analyses under alternative exclusion criteria.
+
+The data only gets loaded and cleaned once (see load_and_merge in
+setup-merge+clean.py). Then each combination of settings in SENSITIVITY_GRID
+just masks out its excluded participants and trials (see ExclusionIndex)
+and reruns both analyses on what's left, with the settings spread over
+n_jobs processes (from the configuration file).
+Everything ends up in one long table, with a row per setting and statistic.
+Statistics that can't be computed (eg, a condition nobody is left in)
+are NA, with the reason in their row.
+"""
+import os
+import itertools
+import importlib
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+# Alternative values for each of the exclusion criteria
+# (the ones actually used are in setup-merge+clean.EXCLUSIONS).
+SENSITIVITY_GRID = dict(
+    minimum_app_version=[0, 63, 65],
+    minimum_age=[18, 21],
+    maximum_session=[7, 10],
+    digit_ids_only=[True, False],
+)
+
+# The app effect totals each participant's first 7 sessions.
+APP_EFFECT_SESSIONS = 7
+
+# Fewer participants than this (in an analysis or a condition) get no stats.
+MIN_PARTICIPANTS = 2
+
+
+def check_grid(grid):
+    """Make sure the analyses can run with every setting in the grid."""
+    assert min(grid["maximum_session"]) >= APP_EFFECT_SESSIONS, \
+        f"The app effect needs {APP_EFFECT_SESSIONS} sessions, so maximum_session can't be lower."
+
+
+# Shared with each worker process once, rather than with every setting.
+_shared = {}
+
+def _share_index(index):
+    _shared["index"] = index
+
+
+def run_setting(settings):
+    """Apply one combination of exclusion settings and run both analyses.
+    Returns a list of rows for the results table.
+    """
+    # The other scripts are only imported here and in run, so importing this
+    # one stays cheap (they're already loaded after the first setting).
+    app_analysis = importlib.import_module("analyze-app_effect")
+    cue_analysis = importlib.import_module("analyze-cue_effect")
+    index = _shared["index"]
+    trial_df, participant_df = index.apply(index.mask(**settings))
+    df = trial_df.merge(participant_df, on="subjectID").reset_index(drop=False)
+    info = dict(settings, n_participants=len(participant_df), n_trials=len(trial_df))
+    rows = []
+
+    data, stats, _ = app_analysis.app_effect(df)
+    row = dict(info, analysis="app_effect", comparison="app-baseline", n=len(data))
+    if len(data) < MIN_PARTICIPANTS:
+        row["reason"] = f"fewer than {MIN_PARTICIPANTS} participants with all {APP_EFFECT_SESSIONS} sessions"
+    elif stats["p-val"].isna().all():
+        row["reason"] = "no participant changed from baseline"
+    else:
+        row.update(mean=np.mean(data["app"] - data["baseline"]), pval=stats.loc["Wilcoxon", "p-val"])
+    rows.append(row)
+
+    # The bootstrap is already split over settings, so it shouldn't split again.
+    results = cue_analysis.cue_effect(df, n_jobs=1)
+    within = results["stats_within"].set_index("subjectCondition")
+    # Conditions nobody is left in aren't in the results at all.
+    condition_ns = dict(within["n"])
+    condition_ns.update({ c: 0 for c in cue_analysis.CONDITIONS if c not in condition_ns })
+    too_small = { c: f"fewer than {MIN_PARTICIPANTS} participants in {c}"
+        for c, n in condition_ns.items() if n < MIN_PARTICIPANTS }
+    for c, n in condition_ns.items():
+        row = dict(info, analysis="cue_effect-within", comparison=c, n=n)
+        if c in too_small:
+            row["reason"] = too_small[c]
+        else:
+            row.update(within.loc[c, ["mean", "ci_lo", "ci_hi", "pval"]])
+        rows.append(row)
+    for _, stats in results["stats_between"].iterrows():
+        pair = [ stats["conditionA"], stats["conditionB"] ]
+        row = dict(info, analysis="cue_effect-between", comparison="-".join(pair))
+        reasons = [ too_small[c] for c in pair if c in too_small ]
+        if reasons:
+            row["reason"] = "; ".join(reasons)
+        else:
+            row["pval"] = stats["pval"]
+        rows.append(row)
+    return rows
+
+
+def run(cache):
+    export_fname = os.path.join(utils.Config.data_directory, "results", "sensitivity.csv")
+    check_grid(SENSITIVITY_GRID)
+
+    merge_clean = importlib.import_module("setup-merge+clean")
+    index = merge_clean.ExclusionIndex(*merge_clean.load_and_merge())
+
+    settings_list = [ dict(zip(SENSITIVITY_GRID, values))
+        for values in itertools.product(*SENSITIVITY_GRID.values()) ]
+
+    n_jobs = utils.get_n_jobs()
+    if n_jobs == 1:
+        _share_index(index)
+        rows = [ run_setting(s) for s in settings_list ]
+    else:
+        with multiprocessing.Pool(n_jobs, initializer=_share_index, initargs=(index,)) as pool:
+            rows = pool.map(run_setting, settings_list)
+
+    columns = list(SENSITIVITY_GRID) + ["n_participants", "n_trials",
+        "analysis", "comparison", "n", "mean", "ci_lo", "ci_hi", "pval", "reason"]
+    results = pd.DataFrame([ r for setting_rows in rows for r in setting_rows ], columns=columns)
+    results.to_csv(export_fname, index=False, na_rep="NA", float_format="%.5f")
+
+
+if __name__ == "__main__":
+    run({})
@@ -6,7 +6,10 @@ The goal of this visualization is to show:
     - the general dream characteristics of the sample (among other variables)
     - which variables -- dream characteristics in particular -- are related to each other
 
-Give it time!!! This takes forever to save, especially the hires.
+Give it time!!! This takes forever to save, so there's no hires copy,
+just the png. To help, all the histograms and stats are computed up front
+and the figure only gets drawn from those.
+Set "draft" under "figures" in the configuration file for a quick look.
 """
 import os
 import numpy as np
@@ -16,31 +19,12 @@ import utils
 
 import colorcet as cc
 import matplotlib.pyplot as plt
-utils.load_matplotlib_settings()
-
-
-#### Choose export path.
-data_dir = utils.Config.data_directory
-export_fname = os.path.join(data_dir, "results", "correlations.png")
-
-
-#### Load and manipulate data
-
-df = utils.load_data("participants")
-
-# some conversions for plotting histograms
-df["subjectCondition"] = pd.Categorical(df["subjectCondition"],
-    categories=["control", "sham", "active"], ordered=True)
-df["appVersion"] = pd.Categorical(df["appVersion"], ordered=True)
-df["subjectCondition"] = df["subjectCondition"].cat.codes.replace(-1, pd.NA)
-df["appVersion"] = df["appVersion"].cat.codes.replace(-1, pd.NA)
 
 
 #### Define parameters.
-HIST_KWARGS = dict(density=True, histtype="step", clip_on=False,
-    color="white", edgecolor="black", linewidth=.5)
-HIST2D_KWARGS = dict(density=False,
-    cmin=1, cmap=cc.cm.dimgray_r, edgecolor="black", linewidth=0)
+STAIRS_KWARGS = dict(fill=False, baseline=0, clip_on=False,
+    color="black", linewidth=.5)
+PCOLORMESH_KWARGS = dict(cmap=cc.cm.dimgray_r, edgecolor="black", linewidth=0)
 VARIABLE_SET = {
     "LDF": dict(n_opts=8, label="LDs", ticklabels=["0", "7+"]),
     "LDF-momentary": dict(n_opts=8, label="momentary\nLDs", ticklabels=["0", "7+"]),
@@ -53,7 +37,7 @@ VARIABLE_SET = {
     "avgSleepQuality": dict(n_opts=5, label="sleep quality", ticklabels=["poor", "good"]),
     "subjectCondition": dict(n_opts=3, label="weekly cue\ncondition", ticklabels=["control", "active"]),
     "age": dict(n_opts=100, label="age", ticklabels=["young", "old"]),
-    "appVersion": dict(label="app version", n_opts=df["appVersion"].nunique(), ticklabels=["early", "recent"]),
+    "appVersion": dict(label="app version", n_opts=None, ticklabels=["early", "recent"]),
     "useFinishedApp": dict(n_opts=3, label="interest in\nfinished app", ticklabels=["no", "yes"]),
 }
 
@@ -62,94 +46,173 @@ n_vars = len(var_order)
 figsize = (n_vars*.8, n_vars*.8)
 
 
+#### Load and manipulate data
+
+def load_variables(cache=None):
+    """Load the participant data and convert
+    all variables to numbers for the histograms.
+    """
+    df = utils.load_data("participants", cache)
+    # some conversions for plotting histograms
+    # (app versions are already stored in order, see setup-merge+clean.py)
+    df["subjectCondition"] = pd.Categorical(df["subjectCondition"],
+        categories=["control", "sham", "active"], ordered=True)
+    df["subjectCondition"] = df["subjectCondition"].cat.codes.replace(-1, pd.NA)
+    df["appVersion"] = df["appVersion"].cat.codes.replace(-1, pd.NA)
+    return df[var_order].astype(float)
+
+
+#### Compute everything that gets drawn.
+
+def get_bins(var, n_opts):
+    if var == "age":
+        return np.linspace(-.5, n_opts+.5, 20)
+    else:
+        return np.arange(-.5, n_opts+.5)
+
+
+def spearman_matrix(values):
+    """Run spearman correlations between all columns of values at once.
+    Like running stats.spearmanr on each pair after dropping missing values,
+    each pair gets ranked using only the rows where both are present.
+    Returns matrices of r values, p values, and number of observations.
+    Pairs with fewer than 3 observations or a constant variable get NaN.
+    """
+    notna = (~np.isnan(values)).astype(float)
+    n = notna.T @ notna
+    rvals = pd.DataFrame(values).corr(method="spearman", min_periods=3).to_numpy()
+    # Same t-test as stats.spearmanr, but for the whole matrix.
+    dof = n - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tvals = rvals * np.sqrt((dof / ((rvals+1) * (1-rvals))).clip(0))
+    pvals = 2 * stats.t.sf(np.abs(tvals), dof)
+    return rvals, pvals, n
+
+
+def compute_panels(values, n_opts):
+    """Compute the histogram counts for every diagonal and lower
+    triangle panel, and the correlation stats for the lower triangle.
+    Returns a dictionary with a panel dictionary for each (row, column).
+    """
+    bins = [ get_bins(var, n_opts[var]) for var in var_order ]
+    notna = ~np.isnan(values)
+    rvals, pvals, nvals = spearman_matrix(values)
+    panels = {}
+    for r in range(n_vars):
+        for c in range(r+1):
+            if c == r: # diagonal -- histogram of x-axis variable
+                x = values[notna[:, c], c]
+                counts, _ = np.histogram(x, bins=bins[c], density=True)
+                panels[r, c] = dict(counts=counts, n=x.size)
+            else: # lower triangle -- heatmap of x/y variables
+                mask = notna[:, c] & notna[:, r]
+                counts, _, _ = np.histogram2d(values[mask, c], values[mask, r], bins=(bins[c], bins[r]))
+                counts[counts < 1] = np.nan # same as hist2d cmin=1
+                if np.isnan(rvals[r, c]): # say why there are no stats for this panel
+                    reason = "fewer than 3 participants" if nvals[r, c] < 3 else "no variation"
+                    print(f"No correlation between {var_order[c]} and {var_order[r]} ({reason}).")
+                panels[r, c] = dict(counts=counts, n=mask.sum(), rval=rvals[r, c], pval=pvals[r, c])
+    return panels
+
+
 #### Draw plot.
 
-# open figure and axes
-fig, axes = plt.subplots(ncols=n_vars, nrows=n_vars,
-    figsize=figsize, sharex=False, sharey=False)
-
-# loop over rows and columns to plot each axis
-for r in range(n_vars):
-    for c in range(n_vars):
-        ax = axes[r, c]
-        ax.set_box_aspect(1)
-        xvar = var_order[c]
-        yvar = var_order[r]
-        ax.grid(False)
-        ax.tick_params(which="both", left=False, bottom=False, top=False, right=False)
-
-        # choose bins and tick stuff
-        if xvar == "age":
-            xbins = np.linspace(-.5, VARIABLE_SET[xvar]["n_opts"]+.5, 20)
-        else:
-            xbins = np.arange(-.5, VARIABLE_SET[xvar]["n_opts"]+.5)
-        if yvar == "age":
-            ybins = np.linspace(-.5, VARIABLE_SET[yvar]["n_opts"]+.5, 20)
-        else:
-            ybins = np.arange(-.5, VARIABLE_SET[yvar]["n_opts"]+.5)
-        xlim = (xbins[0], xbins[-1])
-        ylim = (ybins[0], ybins[-1])
-        xminorlocator = plt.MultipleLocator(1)
-        yminorlocator = plt.MultipleLocator(1)
-        xmajorlocator = plt.FixedLocator([0, VARIABLE_SET[xvar]["n_opts"]-1])
-        ymajorlocator = plt.FixedLocator([0, VARIABLE_SET[yvar]["n_opts"]-1])
-        xticklabels = VARIABLE_SET[xvar]["ticklabels"]
-        yticklabels = VARIABLE_SET[yvar]["ticklabels"]
-
-        ## drawing section
-        if c == r: # diagonal -- draw histogram of x-axis variable
-            n, bins, patches = ax.hist(xvar, bins=xbins, data=df, **HIST_KWARGS)
-            for side, spine in ax.spines.items():
-                if side in ["top", "left", "right"]:
-                    spine.set_visible(False)
-            ax.tick_params(left=False, labelleft=False, top=False, right=False)
-            if c+1 < n_vars:
-                ax.tick_params(bottom=False, labelbottom=False)
-            n = df[xvar].notna().sum()
-            n_txt = fr"$n={n:.0f}$"
-            ax.text(.95, .95, n_txt, transform=ax.transAxes, ha="right", va="top")
-
-        elif r < c: # upper triangle -- draw nothing
-            ax.axis("off")
-        elif r > c: # lower triangle -- heatmap of x/y variables
-            plot_df = df[[xvar, yvar]].dropna()
-            n = len(plot_df)
-            ax.hist2d(xvar, yvar, bins=(xbins, ybins), data=plot_df, **HIST2D_KWARGS)
-            if c > 0:
-                ax.tick_params(which="both", labelleft=False)
-            
-            try: # run correlation and show stats if possible
-                x = plot_df[xvar].values
-                y = plot_df[yvar].values
-                rval, pval = stats.spearmanr(x, y)
-                r_txt = fr"$r={rval:.2f}$"
-                if abs(rval) > 0 and abs(rval) < 1:
-                    r_txt = r_txt.replace("0", "", 1)
-                sigchars = "*" * sum([ pval < x for x in (.05, .01, .001) ])
-                r_txt = sigchars + r_txt
-                txt_color = "black" if pval < .1 else "gainsboro"
-                ax.text(.95, .05, r_txt, color=txt_color,
-                    transform=ax.transAxes, ha="right", va="bottom")
-            except:
-                pass
-            ax.set_ylim(*ylim)
-
-        ax.xaxis.set(major_locator=xmajorlocator, minor_locator=xminorlocator)
-        ax.yaxis.set(major_locator=ymajorlocator, minor_locator=yminorlocator)
-        ax.set_xticklabels(xticklabels)
-        ax.set_yticklabels(yticklabels)
-        ax.set_xlim(*xlim)
-        if c == 0:
-            ax.set_ylabel(VARIABLE_SET[yvar]["label"], labelpad=1)
-        if r+1 == n_vars:
-            ax.set_xlabel(VARIABLE_SET[xvar]["label"], labelpad=1)
-        else:
-            ax.tick_params(which="both", labelbottom=False)
-
-fig.align_labels()
-
-
-#### Export figure.
-plt.savefig(export_fname)
-# utils.save_hires_copies(export_fname)
-plt.close()
\ No newline at end of file
+def draw_figure(panels, n_opts):
+    # open figure and axes
+    fig, axes = plt.subplots(ncols=n_vars, nrows=n_vars,
+        figsize=figsize, sharex=False, sharey=False)
+
+    # loop over rows and columns to plot each axis
+    for r in range(n_vars):
+        for c in range(n_vars):
+            ax = axes[r, c]
+            ax.set_box_aspect(1)
+            xvar = var_order[c]
+            yvar = var_order[r]
+            ax.grid(False)
+            ax.tick_params(which="both", left=False, bottom=False, top=False, right=False)
+
+            # choose bins and tick stuff
+            xbins = get_bins(xvar, n_opts[xvar])
+            ybins = get_bins(yvar, n_opts[yvar])
+            xlim = (xbins[0], xbins[-1])
+            ylim = (ybins[0], ybins[-1])
+            xminorlocator = plt.MultipleLocator(1)
+            yminorlocator = plt.MultipleLocator(1)
+            xmajorlocator = plt.FixedLocator([0, n_opts[xvar]-1])
+            ymajorlocator = plt.FixedLocator([0, n_opts[yvar]-1])
+            xticklabels = VARIABLE_SET[xvar]["ticklabels"]
+            yticklabels = VARIABLE_SET[yvar]["ticklabels"]
+
+            ## drawing section
+            if c == r: # diagonal -- draw histogram of x-axis variable
+                panel = panels[r, c]
+                ax.stairs(panel["counts"], xbins, **STAIRS_KWARGS)
+                for side, spine in ax.spines.items():
+                    if side in ["top", "left", "right"]:
+                        spine.set_visible(False)
+                ax.tick_params(left=False, labelleft=False, top=False, right=False)
+                if c+1 < n_vars:
+                    ax.tick_params(bottom=False, labelbottom=False)
+                n_txt = fr"$n={panel['n']:.0f}$"
+                ax.text(.95, .95, n_txt, transform=ax.transAxes, ha="right", va="top")
+
+            elif r < c: # upper triangle -- draw nothing
+                ax.axis("off")
+            elif r > c: # lower triangle -- heatmap of x/y variables
+                panel = panels[r, c]
+                ax.pcolormesh(xbins, ybins, panel["counts"].T, **PCOLORMESH_KWARGS)
+                if c > 0:
+                    ax.tick_params(which="both", labelleft=False)
+
+                rval, pval = panel["rval"], panel["pval"]
+                if not np.isnan(rval): # show stats if there are any
+                    r_txt = fr"$r={rval:.2f}$"
+                    if abs(rval) > 0 and abs(rval) < 1:
+                        r_txt = r_txt.replace("0", "", 1)
+                    sigchars = "*" * sum([ pval < x for x in (.05, .01, .001) ])
+                    r_txt = sigchars + r_txt
+                    txt_color = "black" if pval < .1 else "gainsboro"
+                    ax.text(.95, .05, r_txt, color=txt_color,
+                        transform=ax.transAxes, ha="right", va="bottom")
+                ax.set_ylim(*ylim)
+
+            ax.xaxis.set(major_locator=xmajorlocator, minor_locator=xminorlocator)
+            ax.yaxis.set(major_locator=ymajorlocator, minor_locator=yminorlocator)
+            ax.set_xticklabels(xticklabels)
+            ax.set_yticklabels(yticklabels)
+            ax.set_xlim(*xlim)
+            if c == 0:
+                ax.set_ylabel(VARIABLE_SET[yvar]["label"], labelpad=1)
+            if r+1 == n_vars:
+                ax.set_xlabel(VARIABLE_SET[xvar]["label"], labelpad=1)
+            else:
+                ax.tick_params(which="both", labelbottom=False)
+
+    fig.align_labels()
+    return fig
+
+
+def run(cache):
+    utils.load_matplotlib_settings()
+
+    #### Choose export path.
+    export_fname = os.path.join(utils.Config.data_directory, "results", "correlations.png")
+
+    df = load_variables(cache)
+
+    # Number of options is fixed for all but app version.
+    n_opts = { var: opts["n_opts"] for var, opts in VARIABLE_SET.items() }
+    n_opts["appVersion"] = df["appVersion"].nunique()
+
+    panels = compute_panels(df.to_numpy(dtype=float, na_value=np.nan), n_opts)
+
+
+    #### Export figure (png only, see above).
+    fig = draw_figure(panels, n_opts)
+    utils.export_figure(export_fname, fig, formats=[])
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    run({})
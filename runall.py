@@ -1,21 +1,295 @@
+"""Run the whole pipeline, but only the stages that are out of date.
+
+Each stage is one script, with the files it reads and writes listed below
+(the same paths as in the README and each script's export filenames).
+Like make, a stage gets rerun if any of its outputs are missing or older
+than any of its inputs (which include the script itself and the utils
+submodules it uses), or if any of the config.json values it reads changed
+since it last ran (a hash of them is kept in derivatives/cache).
+By default, all the stages run one after another in this one interpreter
+(each script has a run function for that), so the big imports only
+happen once and loaded dataframes get shared between stages (see
+utils.load_data). With more than one job (--jobs, or runall_jobs in
+config.json), each stage runs in its own python process instead, and
+stages that don't depend on each other (eg, the describe-* plots) run
+in parallel. That's separate from n_jobs in config.json, the number of
+workers each stage uses for its own parallel steps.
+
+    python runall.py                # run stale stages
+    python runall.py --force        # run everything
+    python runall.py --dry-run      # just show what would run
+    python runall.py --jobs 4       # up to 4 stages at once, as separate processes
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import functools
+import importlib
+import traceback
 import subprocess
+import concurrent.futures
+import utils
+
+
+data_dir = utils.Config.data_directory
+config = utils.load_config(as_object=False)
+
+def source(fname):
+    return os.path.join(data_dir, "source", fname)
+
+def derivative(fname):
+    return os.path.join(data_dir, "derivatives", fname)
+
+def result(fname):
+    return os.path.join(data_dir, "results", fname)
+
+def hires(fname):
+    return os.path.join(data_dir, "results", "hires", fname)
+
+log_ext = "." + getattr(utils.Config, "log_format", "json")
+clean_trials = [ derivative("trials-clean.csv"), derivative("trials-clean.parquet") ]
+clean_participants = [ derivative("participants-clean.csv"), derivative("participants-clean.parquet") ]
+
+# Stages in the order they'd run serially.
+# "after" lists stages that must finish first but share no files with this one.
+# "utils" lists the utils submodules it uses (besides config, which they all do),
+# and "config" the top-level config.json keys its outputs depend on.
+STAGES = {
+    "setup-directories": dict(
+        inputs=[],
+        outputs=[ derivative(""), result(""), hires("") ],
+    ),
+    "setup-source2csv": dict(
+        inputs=[ source("luciddreamdata.txt") ],
+        outputs=[ derivative("participants.csv"), derivative("trials.csv"),
+            derivative("events" + log_ext), derivative("motion" + log_ext) ]
+            + ([ derivative("motion.npz") ] if getattr(utils.Config, "motion_arrays", False) else []),
+        after=["setup-directories"],
+        utils=["ampm", "data"],
+        config=["log_format", "motion_arrays"],
+    ),
+    "setup-merge+clean": dict(
+        inputs=[ derivative("trials.csv"), derivative("participants.csv"),
+            source("variables_legend.xlsx"), source("reports-4ratings.xls") ],
+        outputs=clean_trials + clean_participants,
+        utils=["ampm", "appversion", "data"],
+    ),
+    "describe-samplesize": dict(
+        inputs=clean_trials,
+        outputs=utils.figure_export_fnames(result("samplesize.png")),
+        utils=["appversion", "data", "plotting"],
+        config=["figures"],
+    ),
+    "describe-demographics": dict(
+        inputs=clean_participants,
+        outputs=utils.figure_export_fnames(result("demographics.png")),
+        utils=["appversion", "data", "plotting"],
+        config=["figures", "colors"],
+    ),
+    "describe-correlations": dict(
+        inputs=clean_participants,
+        outputs=[ result("correlations.png") ], # no hires copy, see the script
+        utils=["appversion", "data", "plotting"],
+        config=["figures"],
+    ),
+    "analyze-app_effect": dict(
+        inputs=clean_trials + clean_participants,
+        outputs=[ result("app_effect-data.csv"), result("app_effect-stats.csv"),
+            result("app_effect-timedesc.csv") ],
+        utils=["appversion", "data"],
+    ),
+    "analyze-cue_effect": dict(
+        inputs=clean_trials + clean_participants,
+        outputs=[ result("cue_effect-data.csv"), result("cue_effect-descriptives.csv"),
+            result("cue_effect-stats_within.csv"), result("cue_effect-stats_between.csv"),
+            result("cue_effect-potentialn.txt"), result("cue_effect-potentialn_increasing.json") ],
+        utils=["appversion", "data", "stats"],
+    ),
+    "analyze-sensitivity": dict(
+        inputs=[ derivative("trials.csv"), derivative("participants.csv"),
+            source("variables_legend.xlsx"), source("reports-4ratings.xls"),
+            "./setup-merge+clean.py", "./analyze-app_effect.py", "./analyze-cue_effect.py" ],
+        outputs=[ result("sensitivity.csv") ],
+        # Both this and setup-merge+clean use the caches in derivatives/cache.
+        after=["setup-merge+clean"],
+        utils=["ampm", "appversion", "data", "stats"],
+    ),
+    "plot-app_effect": dict(
+        inputs=[ result("app_effect-data.csv"), result("app_effect-stats.csv") ],
+        outputs=utils.figure_export_fnames(result("app_effect-plot.png")),
+        utils=["plotting"],
+        config=["figures"],
+    ),
+    "plot-cue_effect": dict(
+        inputs=[ result("cue_effect-stats_within.csv"), result("cue_effect-stats_between.csv") ],
+        outputs=utils.figure_export_fnames(result("cue_effect-plot.png")),
+        utils=["plotting"],
+        config=["figures", "colors"],
+    ),
+}
+
+
+def get_dependencies(stages, ordering=True):
+    """Find which stages each stage depends on,
+    ie, those that write any of its inputs. With ordering,
+    also the ones listed in "after", which it only has to wait for.
+    """
+    producers = { fname: bn for bn, stage in stages.items() for fname in stage["outputs"] }
+    return { bn: set(stage.get("after", []) if ordering else [])
+            | { producers[fname] for fname in stage["inputs"] if fname in producers }
+        for bn, stage in stages.items() }
+
+
+config_stamps_fname = derivative(os.path.join("cache", "runall-config.json"))
+
+def config_hash(bn):
+    """Hash the config.json values a stage reads, to notice when they change."""
+    values = { key: config.get(key) for key in STAGES[bn].get("config", []) }
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def read_config_stamps():
+    """Load the config hash each stage last ran with (see config_hash)."""
+    if not os.path.exists(config_stamps_fname):
+        return {}
+    with open(config_stamps_fname, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_config_stamps(stamps):
+    os.makedirs(os.path.dirname(config_stamps_fname), exist_ok=True)
+    tmp_fname = config_stamps_fname + ".tmp"
+    with open(tmp_fname, "w", encoding="utf-8") as f:
+        json.dump(stamps, f, indent=4, sort_keys=True)
+    os.replace(tmp_fname, config_stamps_fname)
+
+
+def is_stale(bn, config_stamps):
+    """A stage is stale if any of its outputs are missing
+    or older than any of its inputs (including the code),
+    or it last ran with different config.json values.
+    """
+    stage = STAGES[bn]
+    if not all(os.path.exists(fname) for fname in stage["outputs"]):
+        return True
+    if "config" in stage and config_stamps.get(bn) != config_hash(bn):
+        return True
+    code = [ f"./{bn}.py", "./utils/__init__.py", "./utils/config.py" ] \
+        + [ f"./utils/{module}.py" for module in stage.get("utils", []) ]
+    inputs = code + stage["inputs"]
+    # Directories only need to exist, their timestamps change with their contents.
+    output_mtimes = [ os.path.getmtime(f) for f in stage["outputs"] if not os.path.isdir(f) ]
+    input_mtimes = [ os.path.getmtime(f) for f in inputs if os.path.exists(f) ]
+    if not output_mtimes or not input_mtimes:
+        return False
+    return min(output_mtimes) < max(input_mtimes)
+
+
+def run_stage(bn):
+    cmd = [sys.executable, f"./{bn}.py"]
+    print(" ".join(cmd), flush=True)
+    return subprocess.run(cmd, check=False).returncode
+
+
+def run_stage_in_process(bn, cache):
+    """Import a stage's script as a module and call its run function.
+    Settings all come from utils.Config, just like running the script itself.
+    Returns an exit code like run_stage does.
+    """
+    print(f"running {bn}", flush=True)
+    try:
+        importlib.import_module(bn).run(cache)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+class InProcessExecutor(concurrent.futures.Executor):
+    """Runs each submitted stage right away, in the main thread,
+    so run_pipeline can treat both ways of running stages the same.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def run_pipeline(force=False, dry_run=False, jobs=1):
+    """Run stale stages as soon as the stages they depend on are done.
+    Returns True if everything finished without error.
+    With jobs of 1, stages run in this process and share a cache,
+    otherwise up to that many run at once as subprocesses.
+    Either way, each stage uses n_jobs workers for its own parallel steps.
+    """
+    if jobs == 1:
+        executor = InProcessExecutor()
+        run = functools.partial(run_stage_in_process, cache={})
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        run = run_stage
+    dependencies = get_dependencies(STAGES)
+    # Only stages that write its inputs make a stage stale, not the "after" ones.
+    input_dependencies = get_dependencies(STAGES, ordering=False)
+    config_stamps = read_config_stamps()
+    done = set()
+    rerun = set()
+    running = {}
+    failed = False
+
+    def finish(future):
+        nonlocal failed
+        bn = running.pop(future)
+        if future.result() != 0:
+            print(f"{bn} failed, not starting any more stages.")
+            failed = True
+        else:
+            done.add(bn)
+            config_stamps[bn] = config_hash(bn)
+            write_config_stamps(config_stamps)
+
+    with executor:
+        while True:
+            # Start (or skip) every stage whose dependencies are all done.
+            # Skipping one can make others ready, so repeat until nothing changes.
+            ready = True
+            while ready and not failed:
+                ready = [ bn for bn in STAGES if bn not in done and bn not in running.values()
+                    and dependencies[bn] <= done ]
+                for bn in ready:
+                    if failed:
+                        break
+                    # Anything downstream of a stage that reran is stale too.
+                    if force or input_dependencies[bn] & rerun or is_stale(bn, config_stamps):
+                        rerun.add(bn)
+                        if not dry_run:
+                            future = executor.submit(run, bn)
+                            running[future] = bn
+                            # Stages run in this process are already finished,
+                            # so a failure has to stop the rest of this batch.
+                            if future.done():
+                                finish(future)
+                            continue
+                        print(f"{bn} is out of date")
+                    done.add(bn)
+                ready = [ bn for bn in ready if bn in done ]
+            if not running:
+                break
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                finish(future)
+    return not failed and len(done) == len(STAGES)
+
 
-file_basenames = [
-    "setup-directories",
-    "setup-source2csv",
-    "setup-merge+clean",
-    "describe-samplesize",
-    "describe-demographics",
-    "describe-correlations",
-    "analyze-app_effect",
-    "analyze-cue_effect",
-    "plot-app_effect",
-    "plot-cue_effect",
-]
-
-for bn in file_basenames:
-    cmd = f"python ./{bn}.py"
-    print(cmd)
-    p = subprocess.run(cmd, check=False)
-    if p.returncode != 0:
-        break
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rerun out-of-date stages of the pipeline.")
+    parser.add_argument("--force", action="store_true", help="run all stages, even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages that would run")
+    parser.add_argument("--jobs", type=int, default=None, help="max stages to run at once, as separate processes (default: runall_jobs in config.json, and 1 runs them all in this process)")
+    args = parser.parse_args()
+    # Not n_jobs, that's how many workers each stage uses itself.
+    jobs = args.jobs if args.jobs is not None else getattr(utils.Config, "runall_jobs", 1)
+    success = run_pipeline(force=args.force, dry_run=args.dry_run, jobs=utils.get_n_jobs(jobs))
+    sys.exit(0 if success else 1)
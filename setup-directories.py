@@ -16,10 +16,16 @@ DATA_SUBDIRECTORIES = [
     "results/hires",    # for high resolution plots (vector graphics)
 ]
 
-if not os.path.isdir(utils.Config.data_directory):
-    os.mkdir(utils.Config.data_directory)
 
-for subdir in DATA_SUBDIRECTORIES:
-    subdir_path = os.path.join(utils.Config.data_directory, subdir)
-    if not os.path.isdir(subdir_path):
-        os.mkdir(subdir_path)
+def run(cache):
+    if not os.path.isdir(utils.Config.data_directory):
+        os.mkdir(utils.Config.data_directory)
+
+    for subdir in DATA_SUBDIRECTORIES:
+        subdir_path = os.path.join(utils.Config.data_directory, subdir)
+        if not os.path.isdir(subdir_path):
+            os.mkdir(subdir_path)
+
+
+if __name__ == "__main__":
+    run({})
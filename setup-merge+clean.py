@@ -7,59 +7,114 @@ And apply exclusion criteria (not based on stats, but just extra rows in the raw
 3. Export 2 files:
     - trials-clean.csv holding one row per trial/awakening/dream
     - participants-clean.csv holding one row per participant
+   (each also saved as a typed parquet file with the same name)
 """
 import os
 import ast
-import time
 import string
+import hashlib
+import inspect
+import numpy as np
 import pandas as pd
 import utils
 
 
-##### Choose import/export paths.
-
-import_fname_trials = os.path.join(utils.Config.data_directory, "derivatives", "trials.csv")
-import_fname_participants = os.path.join(utils.Config.data_directory, "derivatives", "participants.csv")
-import_fname_legend = os.path.join(utils.Config.data_directory, "source", "variables_legend.xlsx")
-import_fname_ratings = os.path.join(utils.Config.data_directory, "source", "reports-4ratings.xls")
-
-export_fname_trials = import_fname_trials.replace(".csv", "-clean.csv")
-export_fname_participants = import_fname_participants.replace(".csv", "-clean.csv")
-
-
-##### Load data.
-
-trial_df = pd.read_csv(import_fname_trials)
-participant_df = pd.read_csv(import_fname_participants)
-trial_legend = pd.read_excel(import_fname_legend, sheet_name="trials")
-participant_legend = pd.read_excel(import_fname_legend, sheet_name="participants")
-assert trial_df.shape[1] == trial_legend.shape[0]
-assert participant_df.shape[1] == participant_legend.shape[0]
+##### Make some convenience functions that'll be used later.
 
-ratings_df = pd.read_excel(import_fname_ratings,
-    names=["subjectID", "timestampOrig", "dreamReport", "experimenterRating"])
+def convert2ts(series, orig_fmt, new_fmt):
+    """Convert a series of raw string timestamps to ISO-formatted strings.
+    Timestamps with an unknown AM/PM (marked with "?") become NA.
+    """
+    time_strs = series.dropna().astype(str)
+    if time_strs.empty:
+        return pd.Series(pd.NA, index=series.index, dtype=object, name=series.name)
+    # Replace non-english AM/PM for the whole column at once. Joining on
+    # newlines is safe as long as no timestamp contains one.
+    assert not time_strs.str.contains("\n", regex=False).any(), "Unexpected newline in timestamps."
+    time_strs = pd.Series(utils.convert2ampm("\n".join(time_strs)).split("\n"),
+        index=time_strs.index, dtype=object)
+    time_strs = time_strs[~time_strs.str.contains("?", regex=False)]
+    # Convert to ISO format.
+    tstamps = pd.to_datetime(time_strs, format=orig_fmt)
+    return tstamps.dt.strftime(new_fmt).reindex(series.index).astype(object).fillna(pd.NA)
+
+
+
+##### Compile the variables legend.
+
+def compile_legend(legend):
+    """Compile one sheet of the variables_legend file into a schema,
+    holding everything needed to reduce and type a raw dataframe
+    (see reduce_dataframe and adjust_column_values), with the
+    values cells parsed once. It's all plain python, so it pickles.
+    """
+    schema = dict(
+        n_variables=len(legend),  # for checking the raw file against the legend
+        shortnames={},            # variable -> shortname, for kept variables in order
+        dtypes={},                # shortname -> dtype to cast to
+        replacements={},          # shortname -> {raw value: new value} before casting
+        categories={},            # shortname -> allowed values (nominal and ordinal)
+        datetimes={},             # shortname -> raw timestamp format
+    )
+    for row in legend.query("keep").itertuples(index=False):
+        schema["shortnames"][row.variable] = row.shortname
+        if row.type in ["mixed", "string"]:
+            continue
+        elif row.type == "integer":
+            schema["dtypes"][row.shortname] = "Int64"
+        elif row.type == "float":
+            schema["dtypes"][row.shortname] = "float64"
+        elif row.type == "boolean":
+            bool_values = ast.literal_eval(row.values)
+            assert len(bool_values) == 2
+            schema["replacements"][row.shortname] = dict(zip(bool_values, [True, False]))
+            schema["dtypes"][row.shortname] = "boolean"
+        elif row.type in ["ordinal", "nominal"]:
+            categories = ast.literal_eval(row.values)
+            schema["categories"][row.shortname] = categories
+            if row.type == "ordinal":
+                # Ordinal values are stored as their position in the order.
+                schema["replacements"][row.shortname] = { c: i for i, c in enumerate(categories) }
+                schema["dtypes"][row.shortname] = "Int64"
+            else:
+                schema["dtypes"][row.shortname] = pd.CategoricalDtype(categories)
+        elif row.type == "datetime":
+            schema["datetimes"][row.shortname] = row.values
+        else:
+            raise ValueError(f"Unexpected variable type!!")
+    return schema
 
-# Reduce items in legends to only the relevant ones.
-trial_legend = trial_legend.query("keep")
-participant_legend = participant_legend.query("keep")
 
+def load_legend(fname, sheet_name, cache_dir):
+    """Load one sheet of the variables legend, compiled (see compile_legend).
+    Compiled sheets are cached in cache_dir, keyed on the contents of the
+    legend file and the code of compile_legend, so they get rebuilt
+    whenever either of those changes.
+    """
+    code_key = hashlib.sha256(inspect.getsource(compile_legend).encode()).hexdigest()[:8]
+    cache_fname = os.path.join(cache_dir,
+        f"legend-{sheet_name}-{code_key}-{utils.file_hash(fname)[:16]}.pickle")
+    schema = utils.read_cache(cache_fname)
+    if schema is None:
+        schema = compile_legend(utils.load_excel(fname, sheet_name=sheet_name))
+        utils.write_cache(schema, cache_fname, os.path.join(cache_dir, f"legend-{sheet_name}-*.pickle"))
+    return schema
 
 
-##### Make some convenience functions that'll be used later.
 
-def convert2ts(string, orig_fmt, new_fmt):
-    """Convert a raw string timestamp to ISO-formatted string."""
-    if pd.isna(string):
-        return pd.NA
-    # Replace non-english AM/PM
-    time_str = utils.convert2ampm(string)
-    if "?" in time_str:
-        return pd.NA
-    else:
-        # Convert to ISO format.
-        tstamp_obj = time.strptime(time_str, orig_fmt)
-        tstamp_str = time.strftime(new_fmt, tstamp_obj)
-        return tstamp_str
+def read_raw_csv(fname, schema):
+    """Read a raw csv file, but only the variables that the compiled legend
+    keeps (see compile_legend), with numbers read straight into their dtype.
+    The header is read on its own to check the file against the legend.
+    """
+    n_columns = pd.read_csv(fname, nrows=0).shape[1]
+    assert n_columns == schema["n_variables"], f"{fname} doesn't match the variables legend."
+    # Booleans and ordinals only become numbers after replacing their values.
+    numeric_dtypes = { variable: schema["dtypes"][shortname]
+        for variable, shortname in schema["shortnames"].items()
+        if schema["dtypes"].get(shortname) in ["Int64", "float64"]
+            and shortname not in schema["replacements"] }
+    return pd.read_csv(fname, usecols=list(schema["shortnames"]), dtype=numeric_dtypes)
 
 
 
@@ -84,22 +139,21 @@ def clean_ratings_file(df_):
     return df
 
 
-def reduce_dataframe(df, legend):
-    """Use the variables_legend file to reduce the raw file
-    down to variables of interest.
+def reduce_dataframe(df, schema):
+    """Use the compiled variables_legend file to reduce
+    the raw file down to variables of interest.
     """
     # Reorder columns according to legend excel sheet.
     # Rename them according to the values in legend excel sheet.
-    df = df.reindex(columns=legend["variable"]
-        ).rename(columns=legend.set_index("variable")["shortname"]
-        ).rename_axis(columns=None)
+    df = df.reindex(columns=list(schema["shortnames"])
+        ).rename(columns=schema["shortnames"])
     # Just as in the user dataframe, participants 548785739 and 93689039
     # have some full row duplicates, so remove them.
     # **Do this before converting timestamps, bc this is how it was done to export the file for report ratings.
     df = df.drop_duplicates(keep="first", ignore_index=True)
     # Keep the original timestamp column because it's an
     # identifier in the manually coded dream reports file.
-    if "timeStart" in legend["shortname"].values:
+    if "timeStart" in schema["shortnames"].values():
         timestamp_orig = df["timeStart"].copy()
         df.insert(df.columns.tolist().index("timeStart"), "timestampOrig", timestamp_orig)
     return df
@@ -107,34 +161,16 @@ def reduce_dataframe(df, legend):
 
 ##### Convert wakeup time to a proper timestamp
 
-def adjust_column_values(df_, legend):
-    df = df_.copy()
-    for shortname, row in legend.set_index("shortname").iterrows():
-        if row["type"] in ["mixed", "string"]:
-            continue
-        elif row["type"] == "integer":
-            df[shortname] = df[shortname].astype("Int64")
-        elif row["type"] == "float":
-            df[shortname] = df[shortname].astype(float)
-        elif row["type"] == "boolean":
-            bool_values = ast.literal_eval(row["values"])
-            assert len(bool_values) == 2
-            replacements = { k: v for k, v in zip(bool_values, [True, False])}
-            df[shortname] = df[shortname].replace(replacements).astype("boolean")
-        elif row["type"] in ["ordinal", "nominal"]:
-            ordered = row["type"]=="ordinal"
-            categories = ast.literal_eval(row["values"])
-            categorical = pd.Categorical(df[shortname], categories=categories, ordered=ordered)
-            assert categorical.isna().sum() == df[shortname].isna().sum(), f"Categories in {shortname} might be inaccurate!!"
-            df[shortname] = categorical
-            if row["type"] == "ordinal":
-                df[shortname] = df[shortname].cat.codes.replace(-1, pd.NA)
-        elif row["type"] == "datetime":
-            NEW_FORMAT = "%Y-%m-%dT%H:%M:%S"
-            old_format = row["values"]
-            df[shortname] = df[shortname].apply(convert2ts, orig_fmt=old_format, new_fmt=NEW_FORMAT)
-        else:
-            raise ValueError(f"Unexpected variable type!!")
+def adjust_column_values(df, schema):
+    """Type all the columns of a reduced dataframe according to
+    the compiled variables_legend file, in one pass.
+    """
+    for shortname, categories in schema["categories"].items():
+        assert df[shortname].dropna().isin(categories).all(), f"Categories in {shortname} might be inaccurate!!"
+    df = df.replace(schema["replacements"]).astype(schema["dtypes"])
+    NEW_FORMAT = "%Y-%m-%dT%H:%M:%S"
+    for shortname, old_format in schema["datetimes"].items():
+        df[shortname] = convert2ts(df[shortname], orig_fmt=old_format, new_fmt=NEW_FORMAT)
     return df
 
 
@@ -167,10 +203,9 @@ def clean_trials_dataframe(df_):
     # Sort by participant, and by time within each participant.
     df = df.sort_values(["subjectID", "sessionID", "timeStart"])
     # Add trial ID, indicating number of trials (ie, awakenings) within each night (ie, session).
-    # (timeStart column is selected arbitrarily)
-    trial_id =  df.groupby(["subjectID", "sessionID"]
-        )["timeStart"].transform(lambda s: range(1, 1+s.size)
-        ).astype("Int64")
+    # (the frame is already in order, so just count down each session's rows;
+    # trials without a session get NA)
+    trial_id = (df.groupby(["subjectID", "sessionID"]).cumcount() + 1).astype("Int64")
     df.insert(2, "trialID", trial_id)
 
     # # We have experimentalNight for the night so replace 11-13
@@ -192,122 +227,188 @@ def clean_participants_dataframe(df_):
     return df
 
 
-trial_df = reduce_dataframe(trial_df, trial_legend)
-participant_df = reduce_dataframe(participant_df, participant_legend)
-
-trial_df = adjust_column_values(trial_df, trial_legend)
-participant_df = adjust_column_values(participant_df, participant_legend)
-
-trial_df = clean_trials_dataframe(trial_df)
-participant_df = clean_participants_dataframe(participant_df)
-ratings_df = clean_ratings_file(ratings_df)
-
-
-############### Merge the ratings with the reports.
-
-# These two dataframes are supposed to be match on participant and timestamp.
-# The ratings file was resaved as excel so it messed with some special characters
-# at the end of timestamps. Cut them off, make sure everything is still unique
-# and that all the ratings match something in the reports file.
-trial_df["timestampCut"] = trial_df["timestampOrig"].str[:19]
-ratings_df["timestampCut"] = ratings_df["timestampOrig"].str[:19]
-trial_uniqs = trial_df.groupby(["subjectID", "timestampCut"]).size()
-rating_uniqs = ratings_df.groupby(["subjectID", "timestampCut"]).size()
-assert trial_uniqs.eq(1).all()
-assert rating_uniqs.eq(1).all()
-assert all([ x in trial_uniqs.index for x in rating_uniqs.index ])
-
-# **Keep the many rows from report dataframe that were not included in the ratings.
-# remove the timestamps and dreamreport columns which are unneeded now
-# set indices for proper concatenation
-trial_df = trial_df.set_index(["subjectID", "timestampCut"]).drop(columns="timestampOrig")
-ratings_df = ratings_df.set_index(["subjectID", "timestampCut"]).drop(columns="timestampOrig")
-
-trial_df = pd.concat([trial_df, ratings_df], axis=1,
-        verify_integrity=True, join="outer"
-    ).droplevel("timestampCut").reset_index(drop=False)
-
-
-# trial_df = trial_df.drop(columns=["timestampOrig", "timestampOrigCut"])
-
-# df = pd.merge(
-#     trial_df, ratings_df[["subjectID", "timestampCut", "dreamReportType"]],
-#     on=["subjectID", "timestampCut"], how="left", validate="1:1")
-# # Remove the unformatted timestamps.
-# df = df.drop(columns=["timestampOrig", "timestampOrigCut"])
-
-
-
-
-############################# Dropping participants.
-
-##### Reduce the participants file down to participants in final dataset.
-
-## There are WAY more participants in the participants file than trials file.
-## Likely since people signed up for the app and then didn't use the app.
-
-# Make sure every participant in trials file is in participant file.
-assert participant_df["subjectID"].is_unique, "Expected a unique participant in each row, one or more duplicates present."
-assert trial_df["subjectID"].isin(participant_df["subjectID"]).all()
-
-# Remove anybody from participant file not in trial file.
-participant_df = participant_df[participant_df["subjectID"].isin(trial_df["subjectID"])]
-
-# Remove anyone under 18
-participant_df = participant_df[participant_df["age"]>=18]
-participant_df = participant_df[participant_df["age"].ne(90000)]
-
-# Remove early app versions.
-MINIMUM_APP_VERSION = 63
-# First drop any a/b/etc off the app version
-participant_df = participant_df[
-        participant_df["appVersion"].map( # 
-            lambda x: pd.NA if pd.isna(x) else float("".join([ c for c in x if c.isdigit() ]))
-        ).ge(MINIMUM_APP_VERSION)
-    ]
+def merge_ratings(trial_df, ratings_df):
+    """Add the experimenter ratings to the trials (ie, reports) they belong to.
+    Every rating needs to match exactly one trial, but many trials don't have one.
+    Raises a ValueError listing any ratings that don't match a trial.
+    """
+    # These two dataframes are supposed to be match on participant and timestamp.
+    # The ratings file was resaved as excel so it messed with some special characters
+    # at the end of timestamps. Cut them off, make sure all the ratings
+    # match something in the reports file, and let the merge make sure
+    # everything is still unique.
+    key = ["subjectID", "timestampCut"]
+    trial_df = trial_df.assign(timestampCut=trial_df["timestampOrig"].str[:19]).drop(columns="timestampOrig")
+    ratings_df = ratings_df.assign(timestampCut=ratings_df["timestampOrig"].str[:19])
+    matched = pd.MultiIndex.from_frame(ratings_df[key]).isin(pd.MultiIndex.from_frame(trial_df[key]))
+    if not matched.all():
+        raise ValueError("Ratings without a matching report:\n" + ratings_df[~matched].to_string())
+    # **Keep the many rows from report dataframe that were not included in the ratings.
+    trial_df = trial_df.merge(ratings_df.drop(columns="timestampOrig"),
+        on=key, how="left", validate="1:1").drop(columns="timestampCut")
+    # Put participant ID first.
+    return trial_df[["subjectID"] + [ c for c in trial_df if c != "subjectID" ]]
+
+
+##### Exclusion criteria.
+##### (analyze-sensitivity.py reruns the analyses with other settings)
+
+EXCLUSIONS = dict(
+    minimum_app_version=63, # ignoring any a/b/etc after the number
+    minimum_age=18,
+    maximum_session=7,      # exclude nights beyond the first week
+    digit_ids_only=True,    # exclude participant IDs that aren't just numbers
+)
+
+
+def load_and_merge():
+    """Load, reduce, and clean the trials, participants, and ratings files,
+    and merge the ratings into the trials (ie, everything before exclusions).
+    """
+    import_fname_trials = os.path.join(utils.Config.data_directory, "derivatives", "trials.csv")
+    import_fname_participants = os.path.join(utils.Config.data_directory, "derivatives", "participants.csv")
+    import_fname_legend = os.path.join(utils.Config.data_directory, "source", "variables_legend.xlsx")
+    import_fname_ratings = os.path.join(utils.Config.data_directory, "source", "reports-4ratings.xls")
+    cache_dir = os.path.join(utils.Config.data_directory, "derivatives", "cache")
 
-# Almost all participants are a long number.
-# Others are nathan, nb, Kaj, Sandra, alalalala,
-# and then about 20 4-character codes like c235 (all one letter three numbers).
-# I assume those are pilots or something, so taking them out.
-#
-# **Note this is NOT true for the user dataframe. But there are
-# far more participants in the user dataframe than reports dataframe.
-participant_df = participant_df[participant_df["subjectID"].str.isdigit()]
+    ##### Load data.
 
+    trial_legend = load_legend(import_fname_legend, "trials", cache_dir)
+    participant_legend = load_legend(import_fname_legend, "participants", cache_dir)
+    trial_df = read_raw_csv(import_fname_trials, trial_legend)
+    participant_df = read_raw_csv(import_fname_participants, participant_legend)
 
-### Reduce to only these participants in the trials file
-### and see where that gets you.
-trial_df = trial_df[trial_df["subjectID"].isin(participant_df["subjectID"])]
+    ratings_df = utils.load_excel(import_fname_ratings,
+        names=["subjectID", "timestampOrig", "dreamReport", "experimenterRating"])
 
+    # Reduce to only the relevant items in legends.
+    trial_df = reduce_dataframe(trial_df, trial_legend)
+    participant_df = reduce_dataframe(participant_df, participant_legend)
 
-#################### Exclude nights beyond night 7 and those without info.
+    trial_df = adjust_column_values(trial_df, trial_legend)
+    participant_df = adjust_column_values(participant_df, participant_legend)
 
-# trial_df = trial_df[trial_df["sessionID"].notna()]
-trial_df = trial_df[trial_df["sessionID"].le(7)]
-trial_df["sessionID"] = trial_df["sessionID"].astype(int)
+    trial_df = clean_trials_dataframe(trial_df)
+    participant_df = clean_participants_dataframe(participant_df)
+    ratings_df = clean_ratings_file(ratings_df)
 
-# Since this might have taken some participants out of the trials file,
-# need to make sure the participants file gets reduced to only those in trial file.
-participant_df = participant_df[participant_df["subjectID"].isin(trial_df["subjectID"])]
 
+    ############### Merge the ratings with the reports.
+    trial_df = merge_ratings(trial_df, ratings_df)
 
-# # Convert participant IDs to integers
-# trial_df["subjectID"] = trial_df["subjectID"].astype(int)
-# participant_df["subjectID"] = participant_df["subjectID"].astype(int)
-# Convert participant ID to letters so it's obv categorical.
-num2alpha = lambda num: "".join([ string.ascii_uppercase[int(dig)] for dig in str(num) ])
-trial_df["subjectID"] = trial_df["subjectID"].map(num2alpha)
-participant_df["subjectID"] = participant_df["subjectID"].map(num2alpha)
+    # Make sure every participant in trials file is in participant file.
+    assert participant_df["subjectID"].is_unique, "Expected a unique participant in each row, one or more duplicates present."
+    assert trial_df["subjectID"].isin(participant_df["subjectID"]).all()
 
+    return trial_df, participant_df
 
-############### Check the necessary columns are filled
-# CRITICAL_COLUMNS = ["subjectID", "sessionID", "trialID",
-#     "experimentNight",
-#     "nightCondition"]
-# df = df[df[CRITICAL_COLUMNS].isnull().any(axis=1).eq(False)]
 
+class ExclusionIndex:
+    """The attributes that the exclusion criteria look at, derived once
+    (one row per participant, indexed by subjectID, and one per trial),
+    for building keep masks over the trials.
 
-# Export.
-trial_df.to_csv(export_fname_trials, index=False, na_rep="NA")
-participant_df.to_csv(export_fname_participants, index=False, na_rep="NA")
+    Masks are boolean arrays with one value per trial. Participant criteria
+    get broadcast to each of their trials, so any masks combine with &, |, and ~,
+    and apply takes both dataframes down in one step (a participant is kept
+    as long as any of their trials are). This makes it cheap to
+    try many settings on the same data (see analyze-sensitivity.py).
+    """
+    def __init__(self, trial_df, participant_df):
+        self.trial_df = trial_df
+        self.participant_df = participant_df
+        # Ignore any a/b/etc after the number.
+        app_version = utils.parse_app_versions(participant_df["appVersion"])["major"]
+        # Unparseable versions would be NA and silently excluded, so make sure there are none.
+        unparsed = participant_df["appVersion"].notna().to_numpy() & app_version.isna().to_numpy()
+        assert not unparsed.any(), f"Unexpected app versions: {participant_df.loc[unparsed, 'appVersion'].unique().tolist()}"
+        self.participants = participant_df[["subjectID", "age"]].set_index("subjectID").assign(
+            appVersion=app_version.to_numpy(dtype=float, na_value=np.nan),
+            digitID=participant_df["subjectID"].str.isdigit().to_numpy(),
+        )
+        self.sessions = trial_df["sessionID"].to_numpy(dtype=float, na_value=np.nan)
+        # Row of each trial's participant in the participants dataframe.
+        self.trial_participants = self.participants.index.get_indexer(trial_df["subjectID"])
+        assert (self.trial_participants >= 0).all()
+
+    def participant_mask(self, keep):
+        """Broadcast a boolean mask over participants (eg, from self.participants) to their trials."""
+        keep = np.asarray(pd.Series(keep).fillna(False), dtype=bool)
+        return keep[self.trial_participants]
+
+    def mask(self, minimum_app_version, minimum_age, maximum_session, digit_ids_only):
+        """Build the keep mask for one setting of each exclusion criterion (see EXCLUSIONS)."""
+        attributes = self.participants
+        # Remove anyone underage (90000 is not a real age either).
+        keep = self.participant_mask(attributes["age"].ge(minimum_age) & attributes["age"].ne(90000))
+        # Remove early app versions.
+        keep &= self.participant_mask(attributes["appVersion"].ge(minimum_app_version))
+        # Almost all participants are a long number.
+        # Others are nathan, nb, Kaj, Sandra, alalalala,
+        # and then about 20 4-character codes like c235 (all one letter three numbers).
+        # I assume those are pilots or something, so taking them out.
+        if digit_ids_only:
+            keep &= self.participant_mask(attributes["digitID"])
+        # Exclude nights beyond the last one and those without info (NaN compares False).
+        keep &= self.sessions <= maximum_session
+        return keep
+
+    def apply(self, keep):
+        """Reduce both dataframes to the trials in a keep mask and their participants."""
+        ## There are WAY more participants in the participants file than trials file.
+        ## Likely since people signed up for the app and then didn't use the app.
+        ## So only keep participants who have trials left.
+        keep_participants = np.bincount(self.trial_participants[keep],
+            minlength=len(self.participants)) > 0
+        trial_df = self.trial_df[keep]
+        trial_df["sessionID"] = trial_df["sessionID"].astype(int)
+        return trial_df, self.participant_df[keep_participants]
+
+
+def apply_exclusions(trial_df, participant_df, **criteria):
+    """Drop excluded participants and trials (see EXCLUSIONS and ExclusionIndex)."""
+    index = ExclusionIndex(trial_df, participant_df)
+    return index.apply(index.mask(**criteria))
+
+
+def run(cache):
+
+    export_fname_trials = os.path.join(utils.Config.data_directory, "derivatives", "trials-clean.csv")
+    export_fname_participants = os.path.join(utils.Config.data_directory, "derivatives", "participants-clean.csv")
+
+    trial_df, participant_df = load_and_merge()
+    trial_df, participant_df = apply_exclusions(trial_df, participant_df, **EXCLUSIONS)
+
+
+    # # Convert participant IDs to integers
+    # trial_df["subjectID"] = trial_df["subjectID"].astype(int)
+    # participant_df["subjectID"] = participant_df["subjectID"].astype(int)
+    # Convert participant ID to letters so it's obv categorical.
+    num2alpha = lambda num: "".join([ string.ascii_uppercase[int(dig)] for dig in str(num) ])
+    trial_df["subjectID"] = trial_df["subjectID"].map(num2alpha)
+    participant_df["subjectID"] = participant_df["subjectID"].map(num2alpha)
+
+    # Store app versions in order (by number, then any a/b/etc),
+    # for the ones that are left, so later scripts don't have to sort them out.
+    participant_df["appVersion"] = participant_df["appVersion"].astype(
+        utils.app_version_dtype(participant_df["appVersion"]))
+
+
+    ############### Check the necessary columns are filled
+    # CRITICAL_COLUMNS = ["subjectID", "sessionID", "trialID",
+    #     "experimentNight",
+    #     "nightCondition"]
+    # df = df[df[CRITICAL_COLUMNS].isnull().any(axis=1).eq(False)]
+
+
+    # Export.
+    # The parquet copies keep the column types built above (categorical,
+    # boolean, Int64, etc.) and are much faster to load (see utils.load_data).
+    trial_df.to_csv(export_fname_trials, index=False, na_rep="NA")
+    participant_df.to_csv(export_fname_participants, index=False, na_rep="NA")
+    trial_df.to_parquet(export_fname_trials.replace(".csv", ".parquet"), index=False)
+    participant_df.to_parquet(export_fname_participants.replace(".csv", ".parquet"), index=False)
+
+
+if __name__ == "__main__":
+    run({})
@@ -15,10 +15,18 @@ This script attempts to parse it all out and export 3 files:
     - a "trials" **csv** file that has one dream report per row
     - a "events" **json** file with one entry per user and lots of timestamped events
     - a "motion" **json** file with one entry per user and lots of timestamped events
+
+The events and motion files can be written as columnar **parquet** files
+instead (see log_format in the configuration file and utils.load_logs).
+Motion data can also be saved as parsed numeric arrays in a "motion" **npz**
+file (see motion_arrays in the configuration file and utils.load_motion_arrays).
 """
 import os
 import re
 import json
+import itertools
+import multiprocessing
+import numpy as np
 import pandas as pd
 
 import utils
@@ -27,22 +35,16 @@ import utils
 # This regex pattern is used to parse eventLog and motionData (see below).
 TIMESTAMP_REGEX = r"([0-9]{2}-[0-9]{2}-[0-9]{4} [0-9]{2}:[0-9]{2}:[0-9]{2} [AP\?]M)"
 
+# Number of participant/data line pairs sent to each worker at a time
+# when parsing in parallel (see n_jobs in the configuration file).
+PARALLEL_CHUNKSIZE = 50
 
+# Number of rows per row group when exporting logs to parquet.
+# Smaller groups mean less is read when loading a single participant.
+LOG_ROW_GROUP_SIZE = 100_000
 
-####################### I/O filenames and load data.
-
-data_dir = utils.Config.data_directory
-
-import_fname = os.path.join(data_dir, "source", "luciddreamdata.txt")
-
-export_fname_users = os.path.join(data_dir, "derivatives", "participants.csv")
-export_fname_reports = os.path.join(data_dir, "derivatives", "trials.csv")
-export_fname_events = os.path.join(data_dir, "derivatives", "events.json")
-export_fname_motion = os.path.join(data_dir, "derivatives", "motion.json")
-
-# Load source data as one big string.
-with open(import_fname, "r", encoding="windows-1252") as infile:
-    data = infile.read()
+# This regex pattern is used to find dream reports (see below).
+DREAM_REPORT_REGEX = re.compile(r',"dreamReport.*?\}')
 
 
 
@@ -55,35 +57,47 @@ with open(import_fname, "r", encoding="windows-1252") as infile:
 ## is just the participant ID and the 2nd row is a data entry.
 ## One row will have the participant ID, then the next row the data.
 ## There's also the occassional empty row, but those can be taken out.
-
-# Break apart the txt file by splitting at each new line (ie, each return).
-# This also inherently removes any empty lines.
-content_lines = [ line for line in data.splitlines() if line ]
-
-# Make sure there's an even number of lines (bc assuming lines are ID/data pairings).
-assert len(content_lines)%2 == 0, "Expected even number of lines, found odd."
-# Make sure each odd line has the phrase PARTICIPANT in it.
-assert all([ "PARTICIPANT:" in l for l in content_lines[::2] ]), "Expected 'PARTICIPANT' to appear in all odd lines, it didn't."
-
-
-## Loop over all lines and build lists of user data and dream report data.
 ##
+## The source file is many GB, so it is streamed one line at a time
+## rather than read into memory as one big string.
+
+def iter_line_pairs(fname):
+    """Yield (participant_string, data_string) pairs from the raw
+    data file, one pair at a time, skipping any empty lines.
+    Runs the participant/data pairing checks along the way.
+    """
+    participant_string = None
+    with open(fname, "r", encoding="windows-1252") as infile:
+        for raw_line in infile:
+            # Re-split each line to match str.splitlines(), which
+            # also breaks on some rare control characters.
+            for line in raw_line.splitlines():
+                if not line:
+                    continue
+                if participant_string is None:
+                    # Make sure each odd line has the phrase PARTICIPANT in it.
+                    assert "PARTICIPANT:" in line, "Expected 'PARTICIPANT' to appear in all odd lines, it didn't."
+                    participant_string = line
+                else:
+                    yield participant_string, line
+                    participant_string = None
+    # Make sure there's an even number of lines (bc assuming lines are ID/data pairings).
+    assert participant_string is None, "Expected even number of lines, found odd."
+
 ## Each pair of lines is data from a participant.
 ## The tough part is parsing/extracting the data from
-## each of those. Do that here, save to lists, and then
-## later compile the lists into dataframes to export as csv.
-
-# Initialize empty containers to store data while iterating.
-# 2 empty lists to hold user and dream report data.
-# 2 empty dictionaries for user event and motion data.
-user_data_list = []
-report_data_list = []
-event_log_dict = {}
-motion_log_dict = {}
-
-# Loop over the odd and even elements of the lines list,
-# which will be participant ID and all their data, respectively.
-for participant_string, data_string in zip(content_lines[::2], content_lines[1::2]):
+## each of those, which is done here one pair at a time.
+## Pairs are independent of each other, so they can be
+## parsed in separate processes and collected afterwards.
+
+def parse_line_pair(participant_string, data_string):
+    """Parse one participant/data line pair from the raw data file.
+    Returns the user data dictionary, a list of dream report dictionaries,
+    and a dictionary of parsed eventLog/motionData entries, where each
+    value is a (participant ID, timestamp->entry dictionary) tuple.
+    """
+    report_data_list = []
+    log_entries = {}
 
     # Extract the participant ID from the participant string
     # (ie, remove "PARTICIPANT:" off the left).
@@ -112,14 +126,21 @@ for participant_string, data_string in zip(content_lines[::2], content_lines[1::
     #   we can take only "dreamReport" following a comma.
     # - Use regex to capture everything following "dreamReport"
     #   until the next closing bracket, since that's the end of the dream data.
-    dream_reports = re.findall(r',"dreamReport.*?\}', data_string)
+    # - Keep the match objects, because their spans are used to cut the
+    #   reports back out of data_string in a single pass (see below).
+    dream_reports = list(DREAM_REPORT_REGEX.finditer(data_string))
 
     # There is one element in this list for every dream report found.
     # So if the list is empty, no dream reports were found.
     # If there are any dream reports, add them to the list of dream report data.
     if dream_reports: # This means there is >= 1 dream report.
+        # Collect the pieces of data_string *between* dream reports,
+        # to be joined back together as the user data afterwards.
+        user_data_pieces = []
+        previous_end = 0
         # Loop over each dream report entry from this participant.
-        for dr in dream_reports:
+        for match in dream_reports:
+            dr = match.group()
 
             ## Parse apart the dream report data!
             ##
@@ -156,15 +177,22 @@ for participant_string, data_string in zip(content_lines[::2], content_lines[1::
             ## string so that the non-dream stuff (ie, user data)
             ## can be properly parsed down the road.
 
-            # Remove this particular dream report string
+            # Mark this particular dream report string for removal
             # from the whole dream report data string.
+            start, end = match.span()
             if data_quoted:
                 # If the json was surrounded by quotes, make sure we
                 # get the closing quote out too, which wasn't in the original search.
-                data_string = data_string.replace(dr+'"', "")
-            else:
-                # If not surrounded by quotes, take what was originally found.
-                data_string = data_string.replace(dr, "")
+                # (Without a closing quote, the string is left as-is.)
+                if not data_string.startswith('"', end):
+                    continue
+                end += 1
+            user_data_pieces.append(data_string[previous_end:start])
+            previous_end = end
+
+        # Remove all the dream reports at once by stitching the rest back together.
+        user_data_pieces.append(data_string[previous_end:])
+        data_string = "".join(user_data_pieces)
 
     ## Now the goal is to parse out the rest of the
     ## remaining (non-dream) data into a user-info json.
@@ -220,80 +248,164 @@ for participant_string, data_string in zip(content_lines[::2], content_lines[1::
                 entry_dict = { a: b.strip(":") for a, b in zip(logentries[::2], logentries[1::2]) }
             elif logname == "motionData": # Remove leading comma from motionData entries.
                 entry_dict = { a: b[1:] for a, b in zip(logentries[::2], logentries[1::2]) }
-            # Add to running dictionaries (use user_data version of participant ID).
+            # Keep with the user_data version of participant ID,
+            # which is what the running dictionaries are keyed on.
             participant_id_user_version = str(user_data["pid"])
-            if logname == "eventLog":
-                if participant_id_user_version in event_log_dict:
-                    msg = f"subj {participant_id_user_version} has a new {logname} log, overwriting previous..."
-                    print(msg)
-                event_log_dict[participant_id_user_version] = entry_dict
-            elif logname == "motionData":
-                if participant_id_user_version in motion_log_dict:
-                    msg = f"subj {participant_id_user_version} has a new {logname} log, overwriting previous..."
-                    print(msg)
-                motion_log_dict[participant_id_user_version] = entry_dict
+            log_entries[logname] = (participant_id_user_version, entry_dict)
 
-    # Save user dictionary the master list for later compiling into dataframe! :)
-    user_data_list.append(user_data)
+    return user_data, report_data_list, log_entries
 
 
+def parse_line_pairs(line_pairs):
+    """Parse a chunk of participant/data line pairs (see parse_line_pair)."""
+    return [ parse_line_pair(*pair) for pair in line_pairs ]
 
-## Congratulations.
-## All data has been parsed and can now be compiled into dataframes.
 
-user_df = pd.DataFrame(user_data_list)
-report_df = pd.DataFrame(report_data_list)
+def iter_parsed_line_pairs(fname, n_jobs=1, chunksize=PARALLEL_CHUNKSIZE):
+    """Yield parsed line pairs from the raw data file, in file order.
+    With n_jobs > 1, chunks of line pairs are sent to a process pool.
+    """
+    line_pairs = iter_line_pairs(fname)
+    if n_jobs == 1:
+        for pair in line_pairs:
+            yield parse_line_pair(*pair)
+        return
+    chunks = iter(lambda: list(itertools.islice(line_pairs, chunksize)), [])
+    with multiprocessing.Pool(n_jobs) as pool:
+        for parsed_chunk in pool.imap(parse_line_pairs, chunks):
+            yield from parsed_chunk
 
 
-## Clean up the dataframes.
-##
-## Not preprocessing, but just clean enough to be manageable later.
-
-# Replace any empty string cells with NaNs.
-user_df = user_df.replace("", pd.NA)
-report_df = report_df.replace("", pd.NA)
-
-# The dream report dataframe has a column with an empty string
-# as the column name, rename as UNNAMED explicitly.
-report_df = report_df.rename(columns={"":"UNNAMED"})
-
-# There are two pid columns but one has no information.
-# "pid" is good, while " pid" (with a leading zero) is
-# _almost_ empty. I only found one cell with data, marking
-# " pid" as 505a. But the same 505a is in "pid" too, so
-# that column can be dropped.
-assert 1 == user_df[" pid"].notnull().sum(), "Expected one filled cell, found more or less than that."
-assert "505a" == user_df[" pid"].dropna().unique()[0], "Expected 505a as the only filled cell, it was something else."
-user_df = user_df.drop(columns=" pid")
-
-# Both dataframes have some columns with leading spaces in the name.
-# Replace them with non-leading-zero versions, but first makes sure
-# that won't overwrite anything (as it would have for " pid" and "pid").
-assert not any([ (c.strip() in user_df.columns and c.strip() != c ) for c in user_df.columns ]), "Stripping column names will cause duplicates."
-assert not any([ (c.strip() in report_df.columns and c.strip() != c ) for c in report_df.columns ]), "Stripping column names will cause duplicates."
-user_df.columns = user_df.columns.str.strip()
-report_df.columns = report_df.columns.str.strip()
-
-# The user dataframe has a *lot* of columns because of something
-# where many user data dictionaries have a *unique* key because
-# it includes a timestamp. For example
-#   Enter wake-up time:11:18:00
-#   Enter usual wake-up time:8:05:00 PM
-#   Enter bedtime:03:00:00
-#   Enter usual wake-up time:10 h 11 min 00 s
-#   night7_Enter usual bedtime (Past week):10:48:00 AM
-# These are not really meaningful so 
-# remove them. Could just look for a colon ":", but to be safe
-# also search for "Enter".
-user_df = user_df.drop(columns=
-    [ c for c in user_df.columns if (":" in c and "Enter" in c) ])
-
-
-
-# Export everything!
-user_df.to_csv(export_fname_users, index=False, na_rep="NA")
-report_df.to_csv(export_fname_reports, index=False, na_rep="NA")
-with open(export_fname_events, "w", encoding="utf-8") as outfile:
-    json.dump(event_log_dict, outfile, indent=4, sort_keys=False, ensure_ascii=False)
-with open(export_fname_motion, "w", encoding="utf-8") as outfile:
-    json.dump(motion_log_dict, outfile, indent=4, sort_keys=False, ensure_ascii=False)
\ No newline at end of file
+
+def run(cache):
+
+    ####################### I/O filenames.
+
+    data_dir = utils.Config.data_directory
+
+    import_fname = os.path.join(data_dir, "source", "luciddreamdata.txt")
+
+    export_fname_users = os.path.join(data_dir, "derivatives", "participants.csv")
+    export_fname_reports = os.path.join(data_dir, "derivatives", "trials.csv")
+    # Event and motion logs are json by default, or parquet if
+    # the configuration file sets log_format to "parquet".
+    log_ext = "." + getattr(utils.Config, "log_format", "json")
+    export_fname_events = os.path.join(data_dir, "derivatives", "events" + log_ext)
+    export_fname_motion = os.path.join(data_dir, "derivatives", "motion" + log_ext)
+    export_fname_motion_arrays = os.path.join(data_dir, "derivatives", "motion.npz")
+
+
+    ## Loop over all lines and build lists of user data and dream report data.
+    ##
+    ## Parse each pair of lines (possibly in parallel), save to lists,
+    ## and then later compile the lists into dataframes to export as csv.
+    ## Results come back in file order, so later entries of the same
+    ## participant overwrite earlier ones just like in a serial run.
+
+    # Initialize empty containers to store data while iterating.
+    # 2 empty lists to hold user and dream report data.
+    # 2 empty dictionaries for user event and motion data.
+    user_data_list = []
+    report_data_list = []
+    event_log_dict = {}
+    motion_log_dict = {}
+    running_log_dicts = {"eventLog": event_log_dict, "motionData": motion_log_dict}
+
+    n_jobs = utils.get_n_jobs()
+    for user_data, report_data, log_entries in iter_parsed_line_pairs(import_fname, n_jobs):
+
+        # Save the dream report dictionaries to the master list.
+        report_data_list.extend(report_data)
+
+        # Add log entries to running dictionaries (keyed on user_data version of participant ID).
+        for logname, (participant_id_user_version, entry_dict) in log_entries.items():
+            log_dict = running_log_dicts[logname]
+            if participant_id_user_version in log_dict:
+                msg = f"subj {participant_id_user_version} has a new {logname} log, overwriting previous..."
+                print(msg)
+            log_dict[participant_id_user_version] = entry_dict
+
+        # Save user dictionary the master list for later compiling into dataframe! :)
+        user_data_list.append(user_data)
+
+
+
+    ## Congratulations.
+    ## All data has been parsed and can now be compiled into dataframes.
+
+    user_df = pd.DataFrame(user_data_list)
+    report_df = pd.DataFrame(report_data_list)
+
+
+    ## Clean up the dataframes.
+    ##
+    ## Not preprocessing, but just clean enough to be manageable later.
+
+    # Replace any empty string cells with NaNs.
+    user_df = user_df.replace("", pd.NA)
+    report_df = report_df.replace("", pd.NA)
+
+    # The dream report dataframe has a column with an empty string
+    # as the column name, rename as UNNAMED explicitly.
+    report_df = report_df.rename(columns={"":"UNNAMED"})
+
+    # There are two pid columns but one has no information.
+    # "pid" is good, while " pid" (with a leading zero) is
+    # _almost_ empty. I only found one cell with data, marking
+    # " pid" as 505a. But the same 505a is in "pid" too, so
+    # that column can be dropped.
+    assert 1 == user_df[" pid"].notnull().sum(), "Expected one filled cell, found more or less than that."
+    assert "505a" == user_df[" pid"].dropna().unique()[0], "Expected 505a as the only filled cell, it was something else."
+    user_df = user_df.drop(columns=" pid")
+
+    # Both dataframes have some columns with leading spaces in the name.
+    # Replace them with non-leading-zero versions, but first makes sure
+    # that won't overwrite anything (as it would have for " pid" and "pid").
+    assert not any([ (c.strip() in user_df.columns and c.strip() != c ) for c in user_df.columns ]), "Stripping column names will cause duplicates."
+    assert not any([ (c.strip() in report_df.columns and c.strip() != c ) for c in report_df.columns ]), "Stripping column names will cause duplicates."
+    user_df.columns = user_df.columns.str.strip()
+    report_df.columns = report_df.columns.str.strip()
+
+    # The user dataframe has a *lot* of columns because of something
+    # where many user data dictionaries have a *unique* key because
+    # it includes a timestamp. For example
+    #   Enter wake-up time:11:18:00
+    #   Enter usual wake-up time:8:05:00 PM
+    #   Enter bedtime:03:00:00
+    #   Enter usual wake-up time:10 h 11 min 00 s
+    #   night7_Enter usual bedtime (Past week):10:48:00 AM
+    # These are not really meaningful so 
+    # remove them. Could just look for a colon ":", but to be safe
+    # also search for "Enter".
+    user_df = user_df.drop(columns=
+        [ c for c in user_df.columns if (":" in c and "Enter" in c) ])
+
+
+
+    # Export everything!
+    user_df.to_csv(export_fname_users, index=False, na_rep="NA")
+    report_df.to_csv(export_fname_reports, index=False, na_rep="NA")
+    for log_dict, log_fname in [(event_log_dict, export_fname_events), (motion_log_dict, export_fname_motion)]:
+        if log_fname.endswith(".parquet"):
+            # One row per log entry, sorted by participant so that
+            # utils.load_logs can skip straight to one participant.
+            log_df = utils.logs2frame(log_dict).sort_values("participant_id", kind="stable")
+            log_df.to_parquet(log_fname, index=False, row_group_size=LOG_ROW_GROUP_SIZE)
+        else:
+            with open(log_fname, "w", encoding="utf-8") as outfile:
+                json.dump(log_dict, outfile, indent=4, sort_keys=False, ensure_ascii=False)
+
+    # Optionally also save the motion data already parsed into numbers,
+    # with a timestamp array and a (timestamps x axes) float32 array per participant.
+    if getattr(utils.Config, "motion_arrays", False):
+        motion_arrays = {}
+        for participant_id, entry_dict in motion_log_dict.items():
+            tstamps = pd.to_datetime(pd.Series(list(entry_dict), dtype=object),
+                format=utils.LOG_TIMESTAMP_FORMAT, errors="coerce")
+            motion_arrays[f"{participant_id}/timestamp"] = tstamps.to_numpy(dtype="datetime64[s]")
+            motion_arrays[f"{participant_id}/values"] = utils.parse_motion_payloads(list(entry_dict.values()))
+        np.savez(export_fname_motion_arrays, **motion_arrays)
+
+
+if __name__ == "__main__":
+    run({})
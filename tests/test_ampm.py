@@ -0,0 +1,82 @@
+"""Check utils.convert2ampm against the chain of str.replace calls it replaced."""
+import random
+import pytest
+
+import utils
+
+
+def convert2ampm_chained(string):
+    """The original implementation, frozen here for comparison."""
+    return string.replace("a.m.", "AM"
+        ).replace("am", "AM"
+        ).replace("pm", "PM"
+        ).replace("p.m.", "PM"
+        ).replace("a. m.", "PM"
+        ).replace("p. m.", "PM"
+        ).replace("de.", "?M"       ### ???? ###
+        ).replace("du.", "?M"       ### ???? ###
+        ).replace("nachm.", "PM"    # german
+        ).replace("vorm.", "AM"     # german
+        ).replace("ip.", "PM"       # finnish
+        ).replace("ap.", "AM"       # finnish
+        ).replace("da manhã", "AM"  # portuguese
+        ).replace("da tarde", "PM"  # portuguese
+        ).replace("fm", "AM"        # swedish
+        ).replace("em", "PM"        # swedish
+        ).replace("p.µ.", "AM"      # greek
+        ).replace("µ.µ.", "PM"      # greek
+        ).replace("??", "?M")       ### ???? ###
+
+
+# Including the overlaps where an earlier replacement
+# used to win (see _AMPM_LOOKAHEADS and _AMPM_CHAINED).
+EDGE_CASES = [
+    ("03-07-2021 04:56:31 PM", "03-07-2021 04:56:31 PM"),
+    ("03-07-2021 04:56:31 a.m.", "03-07-2021 04:56:31 AM"),
+    ("03-07-2021 04:56:31 p. m.", "03-07-2021 04:56:31 PM"),
+    ("03-07-2021 04:56:31 a. m.", "03-07-2021 04:56:31 PM"),
+    ("12:00:00 ip.", "12:00:00 PM"),
+    ("12:00:00 ap.", "12:00:00 AM"),
+    ("12:00:00 em", "12:00:00 PM"),
+    ("12:00:00 fm", "12:00:00 AM"),
+    ("ip.m.", "iPM"),
+    ("ip. m.", "iPM"),
+    ("ip.", "PM"),
+    ("ap.m.", "aPM"),
+    ("ap.", "AM"),
+    ("da tarde.", "da tar?M"),
+    ("da tarde", "PM"),
+    ("da manhã", "AM"),
+    ("de.", "?M"),
+    ("du.", "?M"),
+    ("?de.", "?MM"),
+    ("?du.", "?MM"),
+    ("??de.", "?M?M"),
+    ("de.de.", "?M?M"),
+    ("ddu.e.", "d?Me."),
+    ("??", "?M"),
+    ("???", "?M?"),
+    ("nachm.", "PM"),
+    ("vorm.", "AM"),
+    ("p.µ.", "AM"),
+    ("µ.µ.", "PM"),
+    ("µ.p.µ.", "µ.AM"),
+    ("pm.m.", "PM.m."),
+    ("a.m.m.", "AMm."),
+    ("amp.m.", "AMPM"),
+    ("", ""),
+]
+
+@pytest.mark.parametrize("string, expected", EDGE_CASES)
+def test_edge_cases(string, expected):
+    assert convert2ampm_chained(string) == expected
+    assert utils.convert2ampm(string) == expected
+
+
+def test_random_strings():
+    # Short strings over the characters of all the markers, so overlaps are common.
+    alphabet = sorted(set("".join(utils.AMPM_REPLACEMENTS)) | {"?", "x"})
+    rng = random.Random(0)
+    for _ in range(50_000):
+        string = "".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+        assert utils.convert2ampm(string) == convert2ampm_chained(string), string
@@ -0,0 +1,51 @@
+"""Check the trial IDs from setup-merge+clean.py against the groupby-transform they replaced."""
+import importlib
+import numpy as np
+import pandas as pd
+
+merge_clean = importlib.import_module("setup-merge+clean")
+
+
+def make_trials(n, seed=0):
+    """Raw-ish trials, with some sessions missing, in no particular order."""
+    rng = np.random.default_rng(seed)
+    sessions = rng.integers(1, 8, n).astype(object)
+    sessions[rng.random(n) < .05] = None
+    df = pd.DataFrame({
+        "subjectID": rng.integers(0, n // 10, n).astype(str),
+        "sessionID": pd.array(sessions, dtype="Int64"),
+        "timeStart": pd.Series(rng.integers(0, 10**6, n)).map(lambda s: f"2021-03-01T00:00:00+{s:07d}"),
+    })
+    for i in range(1, 5):
+        df[f"reportHowCuesAppeared{i}"] = pd.NA
+    return df
+
+
+def trial_ids_transform(df):
+    """The original trial numbering, frozen here for comparison."""
+    df = df.sort_values(["subjectID", "sessionID", "timeStart"])
+    return df.groupby(["subjectID", "sessionID"]
+        )["timeStart"].transform(lambda s: range(1, 1+s.size)
+        ).astype("Int64")
+
+
+def test_small_example():
+    df = pd.DataFrame({
+        "subjectID": ["a", "a", "a", "b", "b", "b"],
+        "sessionID": pd.array([2, 1, 1, 1, None, 1], dtype="Int64"),
+        "timeStart": ["3", "2", "1", "1", "2", "3"],
+    })
+    for i in range(1, 5):
+        df[f"reportHowCuesAppeared{i}"] = pd.NA
+    clean_df = merge_clean.clean_trials_dataframe(df)
+    assert clean_df["sessionID"].tolist() == [1, 1, 2, 1, 1, pd.NA]
+    assert clean_df["trialID"].tolist() == [1, 2, 1, 1, 2, pd.NA]
+
+
+def test_same_as_transform():
+    df = make_trials(20_000)
+    clean_df = merge_clean.clean_trials_dataframe(df)
+    expected = trial_ids_transform(df)
+    # Missing sessions get NA either way.
+    assert clean_df["trialID"].isna().sum() == df["sessionID"].isna().sum()
+    pd.testing.assert_series_equal(clean_df["trialID"], expected, check_names=False)
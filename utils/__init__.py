@@ -0,0 +1,38 @@
+"""A set of generally useful functions.
+Most are used in multiple scripts.
+
+They're split into submodules, but get accessed straight from utils
+(eg, utils.load_data). Each submodule is only imported the first time
+one of its names is used, and the configuration file is only read the
+first time utils.Config is used, so importing utils costs next to nothing.
+None of the submodules import pandas or matplotlib until a function needs them.
+Run python -m utils.importtime to check that stays true.
+"""
+import importlib
+
+# Submodule -> the names it provides.
+_SUBMODULES = {
+    "config": ["Config", "load_config", "get_config", "get_n_jobs"],
+    "data": ["load_data", "file_hash", "read_cache", "write_cache", "load_excel",
+        "LOG_TIMESTAMP_FORMAT", "logs2frame", "load_logs", "parse_motion_payloads", "load_motion_arrays"],
+    "ampm": ["AMPM_REPLACEMENTS", "convert2ampm"],
+    "appversion": ["APP_VERSION_PATTERN", "parse_app_versions", "app_version_dtype"],
+    "stats": ["bootstrap_means", "bootstrap_ci"],
+    "plotting": ["load_matplotlib_settings", "no_leading_zeros",
+        "figure_export_fnames", "export_figure"],
+}
+_LOCATIONS = { name: submodule for submodule, names in _SUBMODULES.items() for name in names }
+
+__all__ = list(_LOCATIONS)
+
+
+def __getattr__(name):
+    if name not in _LOCATIONS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LOCATIONS[name]}", __name__), name)
+    globals()[name] = value # so this only happens once
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,73 @@
+"""Normalizing the AM/PM markers in timestamps from non-english phones."""
+import re
+
+# Non-english AM/PM markers and their replacements, in order of precedence.
+# https://stackoverflow.com/a/54511526
+AMPM_REPLACEMENTS = {
+    "a.m.": "AM",
+    "am": "AM",
+    "pm": "PM",
+    "p.m.": "PM",
+    "a. m.": "PM",
+    "p. m.": "PM",
+    "de.": "?M",        ### ???? ###
+    "du.": "?M",        ### ???? ###
+    "nachm.": "PM",     # german
+    "vorm.": "AM",      # german
+    "ip.": "PM",        # finnish
+    "ap.": "AM",        # finnish
+    "da manhã": "AM",   # portuguese
+    "da tarde": "PM",   # portuguese
+    "fm": "AM",         # swedish
+    "em": "PM",         # swedish
+    "p.µ.": "AM",       # greek
+    "µ.µ.": "PM",       # greek
+    "??": "?M",         ### ???? ###
+}
+
+# The replacements used to be applied one after another, so an earlier
+# marker wins when it overlaps a later one that starts further left
+# (e.g., "ip.m." -> "iPM"). A single left-to-right pass needs lookaheads
+# to give way to those earlier markers.
+_AMPM_LOOKAHEADS = {
+    "ip.": r"(?! ?m\.)",   # "p.m." and "p. m." come first
+    "ap.": r"(?! ?m\.)",   # "p.m." and "p. m." come first
+    "da tarde": r"(?!\.)", # "de." comes first
+}
+# "??" was applied last, so it also matched a "?" left by "de."/"du.".
+_AMPM_CHAINED = { f"?{k}": ("?" + AMPM_REPLACEMENTS[k]).replace("??", AMPM_REPLACEMENTS["??"])
+    for k in ["de.", "du."] }
+_AMPM_LOOKUP = { **_AMPM_CHAINED, **AMPM_REPLACEMENTS }
+
+
+def _trie_regex(literals):
+    """Build a regex alternation of literal strings, nested as a prefix trie
+    so the regex engine only tries branches that share the next character.
+    Takes a dictionary of literal -> regex to append (e.g., a lookahead).
+    No literal may be a prefix of another, so branch order doesn't matter.
+    """
+    trie = {}
+    for literal, suffix in literals.items():
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[None] = suffix
+    def build(node):
+        branches = [ child if char is None else re.escape(char) + build(child)
+            for char, child in node.items() ]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return build(trie)
+
+_AMPM_REGEX = re.compile("(" + _trie_regex(
+    { k: _AMPM_LOOKAHEADS.get(k, "") for k in _AMPM_LOOKUP }) + ")")
+
+
+def convert2ampm(string):
+    """Replace non-english AM/PM markers with AM/PM (or ?M if ambiguous).
+    Makes a single pass over the string, with the same
+    result as applying each of AMPM_REPLACEMENTS in order.
+    """
+    # Splitting on a capture group leaves the markers at every odd index.
+    pieces = _AMPM_REGEX.split(string)
+    pieces[1::2] = map(_AMPM_LOOKUP.__getitem__, pieces[1::2])
+    return "".join(pieces)
@@ -0,0 +1,28 @@
+"""Parsing the app version strings (eg, "63" or "63b")."""
+
+# A major version number and an optional suffix of letters.
+APP_VERSION_PATTERN = r"^\s*(?P<major>\d+)\s*(?P<suffix>[A-Za-z]*)\s*$"
+
+def parse_app_versions(versions):
+    """Split app version strings into their major version number (Int64)
+    and suffix (string, empty if there isn't one), all at once.
+    Versions that don't look like a number and letters are NA in both.
+    """
+    import pandas as pd
+    versions = pd.Series(versions).astype("string")
+    parts = versions.str.extract(APP_VERSION_PATTERN)
+    parts["major"] = pd.to_numeric(parts["major"]).astype("Int64")
+    return parts
+
+
+def app_version_dtype(versions):
+    """Get an ordered categorical dtype for the app versions that occur,
+    sorted by major version number and then suffix (so "9" < "10" < "10a",
+    which sorting the raw strings gets wrong). Unparseable versions go last.
+    """
+    import pandas as pd
+    categories = pd.Series(versions).dropna().astype("string").drop_duplicates()
+    parts = parse_app_versions(categories.reset_index(drop=True))
+    order = parts.assign(version=categories.to_numpy()).sort_values(
+        ["major", "suffix", "version"], na_position="last")["version"]
+    return pd.CategoricalDtype(order.tolist(), ordered=True)
@@ -0,0 +1,46 @@
+"""Loading the json configuration file."""
+import functools
+
+def load_config(as_object=True):
+    """Loads the json configuration file.
+    With as_object True, it gets returned as a namespace,
+    otherwise a dictionary. Namespace allows it to be
+    accessed like config.data_dir instead of config["data_dir"].
+    """
+    import json
+    from types import SimpleNamespace
+    with open("./config.json", "r", encoding="utf-8") as jsonfile:
+        if as_object:
+            config = json.load(jsonfile, object_hook=lambda d: SimpleNamespace(**d))
+        else:
+            config = json.load(jsonfile)
+    return config
+
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """Load the configuration file the first time it's needed,
+    and reuse it after that. This is what utils.Config gives.
+    """
+    return load_config()
+
+
+def __getattr__(name):
+    # Config is only loaded when it's first accessed, not on import.
+    if name == "Config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_n_jobs(n_jobs=None):
+    """Resolve how many worker processes to use for parallel steps.
+    Defaults to the n_jobs value in the configuration file.
+    1 means run serially, and -1 (or None in the config) means use all cores.
+    """
+    import os
+    if n_jobs is None:
+        n_jobs = getattr(get_config(), "n_jobs", 1)
+    if n_jobs is None or n_jobs == -1:
+        n_jobs = os.cpu_count()
+    assert n_jobs >= 1, f"Expected n_jobs to be -1 or a positive integer, got {n_jobs}."
+    return n_jobs
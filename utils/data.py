@@ -0,0 +1,238 @@
+"""Loading the derivative files and the event/motion logs."""
+import functools
+from .config import get_config
+
+def _derivative_fname(basename):
+    """Get the filename of a derivative file, preferring its typed
+    parquet version over the csv version unless the parquet file is out of date.
+    """
+    import os
+    csv_fname = os.path.join(get_config().data_directory, "derivatives", f"{basename}.csv")
+    parquet_fname = csv_fname.replace(".csv", ".parquet")
+    if os.path.exists(parquet_fname) and (not os.path.exists(csv_fname)
+            or os.path.getmtime(parquet_fname) >= os.path.getmtime(csv_fname)):
+        return parquet_fname
+    return csv_fname
+
+
+def _read_derivative(basename, **csv_kwargs):
+    """Read a derivative file (see _derivative_fname).
+    The csv version loses the ordering of app versions, so that gets redone.
+    App versions get read as text, or all-numeric ones would come back as
+    integers and none of them would match the string categories.
+    """
+    import pandas as pd
+    from .appversion import app_version_dtype
+    fname = _derivative_fname(basename)
+    if fname.endswith(".parquet"):
+        return pd.read_parquet(fname)
+    df = pd.read_csv(fname, dtype={"appVersion": str}, **csv_kwargs)
+    if "appVersion" in df:
+        df["appVersion"] = df["appVersion"].astype(app_version_dtype(df["appVersion"]))
+    return df
+
+
+def file_hash(fname):
+    """Get the sha256 hash of a file's contents."""
+    import hashlib
+    sha = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_cache(cache_fname):
+    """Read a pickled cache file (see write_cache),
+    or get None if it doesn't exist (anymore).
+    """
+    import pandas as pd
+    try:
+        return pd.read_pickle(cache_fname)
+    except FileNotFoundError:
+        return None
+
+
+def write_cache(obj, cache_fname, outdated_pattern):
+    """Pickle obj to cache_fname, and remove any outdated cache files
+    (those matching the glob pattern outdated_pattern).
+    Scripts running in parallel can share cache files, so the pickle
+    is written to a temporary file and then moved into place.
+    Readers only ever see a whole file, or no file at all.
+    """
+    import os
+    import glob
+    import tempfile
+    import pandas as pd
+    cache_dir = os.path.dirname(cache_fname)
+    os.makedirs(cache_dir, exist_ok=True)
+    for old_fname in glob.glob(outdated_pattern):
+        if old_fname != cache_fname:
+            try:
+                os.remove(old_fname)
+            except FileNotFoundError:
+                pass # already removed by another process
+    fd, tmp_fname = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        pd.to_pickle(obj, tmp_fname)
+        os.replace(tmp_fname, cache_fname)
+    except BaseException:
+        os.remove(tmp_fname)
+        raise
+
+
+def load_excel(fname, **excel_kwargs):
+    """Read an excel file (with pd.read_excel and any of its arguments).
+    Parsing excel is slow, so the dataframe gets cached on disk in a pickle
+    file, keyed on the file's contents and the arguments, and it's only
+    reparsed when either of those change.
+    """
+    import os
+    import hashlib
+    import pandas as pd
+    cache_dir = os.path.join(get_config().data_directory, "derivatives", "cache")
+    stem = os.path.splitext(os.path.basename(fname))[0]
+    kwargs_key = hashlib.sha256(repr(sorted(excel_kwargs.items())).encode()).hexdigest()[:8]
+    cache_fname = os.path.join(cache_dir, f"excel-{stem}-{kwargs_key}-{file_hash(fname)[:16]}.pickle")
+    df = read_cache(cache_fname)
+    if df is None:
+        df = pd.read_excel(fname, **excel_kwargs)
+        write_cache(df, cache_fname, os.path.join(cache_dir, f"excel-{stem}-{kwargs_key}-*.pickle"))
+    return df
+
+
+@functools.lru_cache(maxsize=4)
+def _load_merged(trial_fname, subject_fname, file_stats):
+    """Merge the clean trials and participants files.
+    The merged dataframe is cached on disk, keyed on the contents of both
+    files, so it only gets rebuilt when one of them changes. On top of that,
+    results are kept in memory for repeated calls (file_stats is only there
+    to invalidate those when a file is modified in the meantime).
+    """
+    import os
+    import hashlib
+    cache_dir = os.path.join(get_config().data_directory, "derivatives", "cache")
+    key = hashlib.sha256((file_hash(trial_fname) + file_hash(subject_fname)).encode()).hexdigest()
+    cache_fname = os.path.join(cache_dir, f"merged-{key[:16]}.pickle")
+    merged_df = read_cache(cache_fname)
+    if merged_df is None:
+        trial_df = _read_derivative("trials-clean")
+        subject_df = _read_derivative("participants-clean")
+        merged_df = trial_df.merge(subject_df, on="subjectID").reset_index(drop=False)
+        write_cache(merged_df, cache_fname, os.path.join(cache_dir, "merged-*.pickle"))
+    return merged_df
+
+
+def _file_stats(fnames):
+    """Get the modification time and size of each file,
+    to notice when any of them get rewritten.
+    """
+    import os
+    return tuple( (os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in fnames )
+
+
+def load_data(which, cache=None):
+    """Load the clean trials or participants data, or both merged.
+    Uses the parquet files from setup-merge+clean.py when possible,
+    which keep the column types and load faster than csv.
+    The merged data is cached (see _load_merged).
+
+    With a cache dictionary (eg, the one runall.py shares between
+    all the scripts), each dataframe is only loaded once and copies
+    of it get returned after that, until its files are rewritten.
+    """
+    import pandas as pd
+    basenames = {
+        "trials": ["trials-clean"],
+        "participants": ["participants-clean"],
+        "merged": ["trials-clean", "participants-clean"],
+    }
+    if which not in basenames:
+        raise ValueError(f"Unexpected value of {which} for which.")
+    fnames = [ _derivative_fname(bn) for bn in basenames[which] ]
+    if cache is not None:
+        key = ("load_data", which, tuple(fnames), _file_stats(fnames))
+        if key not in cache:
+            cache[key] = load_data(which)
+        # Return a copy so callers can't modify the cached dataframe.
+        return cache[key].copy()
+    if which == "trials":
+        trial_df = _read_derivative("trials-clean", parse_dates=["timeStart"])
+        trial_df["timeStart"] = pd.to_datetime(trial_df["timeStart"])
+        return trial_df
+    elif which == "participants":
+        return _read_derivative("participants-clean")
+    else:
+        # Return a copy so callers can't modify the cached dataframe.
+        return _load_merged(*fnames, _file_stats(fnames)).copy()
+
+
+# Layout of the (AM/PM-converted) eventLog and motionData timestamps.
+LOG_TIMESTAMP_FORMAT = "%m-%d-%Y %I:%M:%S %p"
+
+def logs2frame(log_dict):
+    """Flatten an events or motion log dictionary, as exported
+    by setup-source2csv.py, into one long dataframe with a row per entry.
+    The original timestamp strings are kept in timestampOrig, and
+    converted to integer seconds since the epoch in timestamp
+    (NA for timestamps with unknown AM/PM).
+    """
+    import pandas as pd
+    log_df = pd.DataFrame(
+        [ (pid, tstamp, payload) for pid, entries in log_dict.items() for tstamp, payload in entries.items() ],
+        columns=["participant_id", "timestampOrig", "payload"])
+    tstamps = pd.to_datetime(log_df["timestampOrig"], format=LOG_TIMESTAMP_FORMAT, errors="coerce")
+    epoch = pd.Series(tstamps.to_numpy(dtype="datetime64[s]").astype("int64"), dtype="Int64")
+    log_df.insert(1, "timestamp", epoch.mask(tstamps.isna()))
+    return log_df
+
+
+def load_logs(which, participant_id=None):
+    """Load the events or motion logs as a long dataframe (see logs2frame).
+    Reads whichever format the configuration file's log_format asks for.
+    With participant_id, only that participant's rows are returned, and
+    from parquet the rest of the file doesn't even need to be parsed.
+    """
+    import os
+    import json
+    import pandas as pd
+    if which not in ["events", "motion"]:
+        raise ValueError(f"Unexpected value of {which} for which.")
+    basename = os.path.join(get_config().data_directory, "derivatives", which)
+    if getattr(get_config(), "log_format", "json") == "parquet":
+        filters = None if participant_id is None else [("participant_id", "==", str(participant_id))]
+        return pd.read_parquet(basename + ".parquet", filters=filters)
+    with open(basename + ".json", "r", encoding="utf-8") as jsonfile:
+        log_dict = json.load(jsonfile)
+    if participant_id is not None:
+        log_dict = { str(participant_id): log_dict.get(str(participant_id), {}) }
+    return logs2frame(log_dict)
+
+
+def parse_motion_payloads(payloads):
+    """Parse motionData payload strings (comma-separated readings)
+    into a float32 array with one row per entry and one column per axis.
+    Missing or unparseable readings are NaN.
+    """
+    import numpy as np
+    import pandas as pd
+    readings = pd.Series(payloads, dtype=object).str.strip(",").str.split(",", expand=True)
+    if readings.empty:
+        return np.empty((len(readings), 0), dtype=np.float32)
+    readings = readings.apply(pd.to_numeric, errors="coerce")
+    return readings.to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+def load_motion_arrays(participant_id):
+    """Load one participant's parsed motion data, as exported
+    by setup-source2csv.py when motion_arrays is set in the configuration file.
+    Returns an array of datetime64[s] timestamps (NaT if AM/PM is unknown)
+    and a matching float32 array of readings (timestamps x axes).
+    Only this participant's arrays are read from the file.
+    """
+    import os
+    import numpy as np
+    fname = os.path.join(get_config().data_directory, "derivatives", "motion.npz")
+    with np.load(fname) as npz:
+        return npz[f"{participant_id}/timestamp"], npz[f"{participant_id}/values"]
@@ -0,0 +1,77 @@
+"""Check how long utils and each script take just to import what they need.
+
+    python -m utils.importtime              # from the repo directory
+    python -m utils.importtime --budget 2   # allow scripts 2 seconds
+
+Each set of imports is timed in a fresh interpreter with python -X importtime.
+Importing utils (or any of its submodules) should be nearly free, and
+scripts that don't plot (anything but describe-* and plot-*) shouldn't
+import matplotlib or seaborn. Each script gets imported as a module,
+which runs everything at its top level (the work itself only runs under
+__main__), so it counts whatever the script imports, however it does it.
+"""
+import os
+import sys
+import glob
+import argparse
+import subprocess
+
+
+UTILS_BUDGET = .05 # seconds
+SCRIPT_BUDGET = 2.5 # seconds (seaborn alone takes most of that)
+PLOTTING_MODULES = ["matplotlib", "seaborn"]
+PLOTTING_SCRIPT_PREFIXES = ("describe-", "plot-")
+
+
+def time_imports(modules):
+    """Import modules in a fresh interpreter (by name, so scripts
+    with dashes or plusses in their names work too).
+    Returns the total import time in seconds
+    and the set of all modules that got imported along the way.
+    """
+    code = "import importlib; " + "; ".join( f"importlib.import_module({m!r})" for m in modules )
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True)
+    total = 0
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _, cumulative, name = line.split("|")
+        imported.add(name.strip())
+        # Nested imports are indented, and already in their parent's cumulative time.
+        if len(name) - len(name.lstrip()) == 1:
+            total += int(cumulative) / 1e6
+    return total, imported
+
+
+def check(script_budget=SCRIPT_BUDGET, utils_budget=UTILS_BUDGET):
+    """Print the import time of utils and each script.
+    Returns True if they're all within budget and
+    non-plotting scripts don't import any plotting modules.
+    """
+    utils_modules = [ "utils" ] + [ f"utils.{os.path.basename(f)[:-3]}"
+        for f in sorted(glob.glob("./utils/*.py")) if not f.endswith("__init__.py") ]
+    checks = [ (m, [m], utils_budget, False) for m in utils_modules ]
+    for fname in sorted(glob.glob("./*-*.py")):
+        bn = os.path.basename(fname)[:-3]
+        plots = bn.startswith(PLOTTING_SCRIPT_PREFIXES)
+        checks.append( (bn, [bn], script_budget, plots) )
+    passed = True
+    for name, modules, budget, plots in checks:
+        seconds, imported = time_imports(modules)
+        problems = []
+        if seconds > budget:
+            problems.append(f"over {budget}s budget")
+        if not plots:
+            problems.extend( f"imports {m}" for m in PLOTTING_MODULES if m in imported )
+        passed &= not problems
+        print(f"{name:<24} {seconds:6.2f}s  " + ("ok" if not problems else ", ".join(problems)))
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check how long imports take.")
+    parser.add_argument("--budget", type=float, default=SCRIPT_BUDGET, help="seconds each script's imports may take")
+    args = parser.parse_args()
+    sys.exit(0 if check(script_budget=args.budget) else 1)
@@ -0,0 +1,98 @@
+"""Matplotlib settings and figure exporting.
+Matplotlib itself is only imported when one of these gets called.
+"""
+from .config import get_config
+
+def load_matplotlib_settings():
+    """Load aesthetics I like.
+    """
+    from matplotlib.pyplot import rcParams
+    figures = get_config().figures
+    # rcParams["figure.dpi"] = 600
+    # rcParams["interactive"] = True
+    rcParams["savefig.dpi"] = figures.draft_dpi if figures.draft else figures.dpi
+    rcParams["figure.constrained_layout.use"] = True
+    # rcParams["font.family"] = "Times New Roman"
+    rcParams["font.sans-serif"] = "Arial"
+    rcParams["mathtext.fontset"] = "custom"
+    rcParams["mathtext.rm"] = "Arial"
+    rcParams["mathtext.cal"] = "Arial"
+    rcParams["mathtext.it"] = "Arial:italic"
+    rcParams["mathtext.bf"] = "Arial:bold"
+    rcParams["font.size"] = 8
+    rcParams["axes.titlesize"] = 8
+    rcParams["axes.labelsize"] = 8
+    rcParams["axes.labelsize"] = 8
+    rcParams["xtick.labelsize"] = 8
+    rcParams["ytick.labelsize"] = 8
+    rcParams["axes.linewidth"] = 0.8 # edge line width
+    rcParams["axes.axisbelow"] = True
+    rcParams["axes.grid"] = True
+    rcParams["axes.grid.axis"] = "y"
+    rcParams["axes.grid.which"] = "major"
+    rcParams["axes.labelpad"] = 2
+    rcParams["xtick.top"] = True
+    rcParams["ytick.right"] = True
+    rcParams["xtick.direction"] = "in"
+    rcParams["ytick.direction"] = "in"
+    rcParams["grid.color"] = "gainsboro"
+    rcParams["grid.linewidth"] = 1
+    rcParams["grid.alpha"] = 1
+    rcParams["legend.frameon"] = False
+    rcParams["legend.edgecolor"] = "black"
+    rcParams["legend.fontsize"] = 8
+    rcParams["legend.title_fontsize"] = 8
+    rcParams["legend.borderpad"] = 0
+    rcParams["legend.labelspacing"] = .2 # the vertical space between the legend entries
+    rcParams["legend.handlelength"] = 2 # the length of the legend lines
+    rcParams["legend.handleheight"] = .7 # the height of the legend handle
+    rcParams["legend.handletextpad"] = .2 # the space between the legend line and legend text
+    rcParams["legend.borderaxespad"] = .5 # the border between the axes and legend edge
+    rcParams["legend.columnspacing"] = 1 # the space between the legend line and legend text
+    rcParams["hatch.linewidth"] = .3
+
+
+def no_leading_zeros(x, pos):
+    """A custom tick formatter for matplotlib
+    that will remove leading zeros in front of decimals.
+    """
+    val_str = "{:g}".format(x)
+    if abs(x) > 0 and abs(x) < 1:
+        return val_str.replace("0", "", 1)
+    else:
+        return val_str
+
+
+def figure_export_fnames(png_fname, formats=None):
+    """Get all the filenames a figure gets saved to, the png first.
+    Hi-resolution copies go in a "hires" subdirectory within the path
+    of the png filename, one for each format (default is hires_formats
+    in the configuration file). Draft mode skips the copies.
+    """
+    import os
+    assert png_fname.endswith(".png"), f"Must pass a .png filename, you passed {png_fname}"
+    figures = get_config().figures
+    if figures.draft:
+        return [png_fname]
+    if formats is None:
+        formats = figures.hires_formats
+    png_dir, png_bname = os.path.split(png_fname)
+    hires_dir = os.path.join(png_dir, "hires")
+    return [png_fname] + [ os.path.join(hires_dir, png_bname.replace(".png", "." + f))
+        for f in formats ]
+
+
+def export_figure(png_fname, fig=None, formats=None):
+    """Save a matplotlib figure (current one by default) as a png
+    and all its hi-resolution copies (see figure_export_fnames).
+    The layout is only worked out for the first file, then frozen
+    so the other formats don't have to redo it.
+    """
+    import matplotlib.pyplot as plt
+    if fig is None:
+        fig = plt.gcf()
+    fnames = figure_export_fnames(png_fname, formats)
+    fig.savefig(fnames[0])
+    fig.set_layout_engine("none")
+    for fname in fnames[1:]:
+        fig.savefig(fname)
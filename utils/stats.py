@@ -0,0 +1,75 @@
+"""Bootstrapping with plain numpy, for many groups and resamples at once."""
+
+# Number of resamples drawn at a time (see bootstrap_means).
+BOOTSTRAP_BLOCKSIZE = 10_000
+
+def _bootstrap_block(values, sizes, n, seed):
+    """Draw n resamples of every group of values (concatenated, with sizes
+    giving the length of each group) and return their means (n x groups).
+    Indices for all groups come from one integer matrix (resamples x all values),
+    and all the group means from one reduction.
+    """
+    import numpy as np
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    # For each column of the index matrix, which group it draws from.
+    column_starts = np.repeat(starts, sizes)
+    column_sizes = np.repeat(sizes, sizes)
+    rng = np.random.default_rng(seed)
+    # Scaling uniform draws is faster than rng.integers with per-column bounds.
+    indices = column_starts + (rng.random((n, values.size)) * column_sizes).astype(np.intp)
+    return np.add.reduceat(values[indices], starts, axis=1) / sizes
+
+
+def bootstrap_means(groups, n_boot, seed=None, blocksize=BOOTSTRAP_BLOCKSIZE, n_jobs=1):
+    """Bootstrap the mean of each group of values, all groups at once.
+    For every resample, each group gets resampled (with replacement)
+    to its own size. Returns an array of means (n_boot x groups).
+
+    Resamples are drawn in blocks of blocksize, which caps memory.
+    Each block gets its own random stream, spawned from seed, so with
+    n_jobs > 1 the blocks can be spread over a process pool and the
+    result is still identical for a given seed (and blocksize),
+    however many processes there are.
+    """
+    import numpy as np
+    groups = [ np.asarray(g, dtype=float) for g in groups ]
+    sizes = np.array([ g.size for g in groups ])
+    assert sizes.min() > 0, "Can't bootstrap an empty group."
+    values = np.concatenate(groups)
+    block_sizes = [ min(blocksize, n_boot - first) for first in range(0, n_boot, blocksize) ]
+    block_seeds = np.random.SeedSequence(seed).spawn(len(block_sizes))
+    args = [ (values, sizes, n, s) for n, s in zip(block_sizes, block_seeds) ]
+    if n_jobs == 1 or len(args) < 2:
+        blocks = [ _bootstrap_block(*a) for a in args ]
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(min(n_jobs, len(args))) as pool:
+            blocks = pool.starmap(_bootstrap_block, args)
+    return np.concatenate(blocks) if blocks else np.empty((0, sizes.size))
+
+
+def bootstrap_ci(values, distribution, confidence=.95):
+    """Bias-corrected and accelerated (BCa) confidence interval
+    for the mean of values, from its bootstrap distribution.
+    Same method as scipy.stats.bootstrap (and pingouin.compute_bootci).
+    """
+    import numpy as np
+    from scipy.special import ndtr, ndtri
+    values = np.asarray(values, dtype=float)
+    distribution = np.asarray(distribution)
+    if values.size < 2: # the jackknife needs at least two values
+        return np.full(2, np.nan)
+    mean = values.mean()
+    # Bias correction, from how much of the distribution falls below the sample mean.
+    below = (np.sum(distribution < mean) + np.sum(distribution <= mean)) / (2 * distribution.size)
+    z0 = ndtri(below)
+    # Acceleration, from the jackknife (leave-one-out) means.
+    jackknife = (values.sum() - values) / (values.size - 1)
+    deviations = jackknife.mean() - jackknife
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acceleration = np.sum(deviations**3) / (6 * np.sum(deviations**2)**1.5)
+        z = ndtri(np.array([(1-confidence)/2, (1+confidence)/2]))
+        percentiles = ndtr(z0 + (z0+z) / (1 - acceleration*(z0+z)))
+    if np.isnan(percentiles).any():
+        return np.full(2, np.nan)
+    return np.percentile(distribution, percentiles * 100)